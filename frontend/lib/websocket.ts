@@ -1,7 +1,7 @@
 "use client";
 
 import { fetchState } from "@/lib/api";
-import type { SimState } from "@/lib/types";
+import type { LaneSnapshot, SimState } from "@/lib/types";
 
 type Listener = (state: SimState) => void;
 const FALLBACK_INTERVAL_MS = 500;
@@ -76,22 +76,42 @@ export function connectStateStream(listener: Listener): () => void {
       return;
     }
 
-    socket.onopen = () => {
-      stopFallback();
-    };
+    // Frames flagged `full: false` only carry lanes that changed since the previous frame.
+    let lanes: Record<string, LaneSnapshot> = {};
+    // Binary frames are zlib-compressed JSON; inflate them in arrival order.
+    let pending: Promise<void> = Promise.resolve();
 
-    socket.onmessage = (event) => {
+    const handleFrame = (text: string) => {
       try {
-        const payload = JSON.parse(event.data);
+        const payload = JSON.parse(text);
         const state = payload?.state ?? payload;
         if (state) {
-          listener(state);
+          lanes = payload?.full === false ? { ...lanes, ...state.lanes } : state.lanes ?? {};
+          listener({ ...state, lanes });
         }
       } catch (err) {
         console.error("Failed to parse state payload", err);
       }
     };
 
+    socket.binaryType = "arraybuffer";
+
+    socket.onopen = () => {
+      stopFallback();
+    };
+
+    socket.onmessage = (event) => {
+      if (typeof event.data === "string") {
+        handleFrame(event.data);
+        return;
+      }
+      const data = event.data as ArrayBuffer;
+      pending = pending
+        .then(() => inflateFrame(data))
+        .then(handleFrame)
+        .catch((err) => console.error("Failed to decode state payload", err));
+    };
+
     socket.onerror = (event) => {
       console.warn("State stream error", event);
       ensureFallback();
@@ -118,6 +138,11 @@ export function connectStateStream(listener: Listener): () => void {
   return cleanup;
 }
 
+async function inflateFrame(data: ArrayBuffer): Promise<string> {
+  const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return new Response(stream).text();
+}
+
 function buildWsUrl(): string {
   const override = process.env.NEXT_PUBLIC_WS_STATE_URL;
   if (override) {
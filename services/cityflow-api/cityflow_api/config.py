@@ -1,40 +1,50 @@
 from __future__ import annotations
 
 import os
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from pathlib import Path
 
 from pydantic import BaseModel, Field
 
+# Directories already created by this process; lets hot paths skip redundant mkdir syscalls.
+_ENSURED_DIRS: set[str] = set()
+
+# Environment-derived defaults, read once at import time.
+_DATA_DIR = Path(os.getenv("DATA_DIR", "/app/data"))
+_EXPERIMENTS_DIR = Path(os.getenv("EXPERIMENTS_DIR", "/app/experiments"))
+_EXAMPLES_DIR = Path(os.getenv("EXAMPLES_DIR", "/app/examples"))
+_SIM_BASE_URL = os.getenv("SIM_BASE_URL", "http://cityflow-sim:7001")
+_STATE_POLL_INTERVAL = float(os.getenv("STATE_POLL_INTERVAL", "2.0"))
+_RETENTION_LIMIT = int(os.getenv("RETENTION_LIMIT", "50"))
+
 
 class Settings(BaseModel):
-    data_dir: Path = Field(
-        default_factory=lambda: Path(os.getenv("DATA_DIR", "/app/data"))
-    )
-    experiments_dir: Path = Field(
-        default_factory=lambda: Path(os.getenv("EXPERIMENTS_DIR", "/app/experiments"))
-    )
-    examples_dir: Path = Field(
-        default_factory=lambda: Path(os.getenv("EXAMPLES_DIR", "/app/examples"))
-    )
-    sim_base_url: str = Field(
-        default_factory=lambda: os.getenv("SIM_BASE_URL", "http://cityflow-sim:7001")
-    )
-    state_poll_interval: float = Field(
-        default_factory=lambda: float(os.getenv("STATE_POLL_INTERVAL", "2.0"))
-    )
-    retention_limit: int = Field(
-        default_factory=lambda: int(os.getenv("RETENTION_LIMIT", "50"))
-    )
+    data_dir: Path = Field(default=_DATA_DIR)
+    experiments_dir: Path = Field(default=_EXPERIMENTS_DIR)
+    examples_dir: Path = Field(default=_EXAMPLES_DIR)
+    sim_base_url: str = Field(default=_SIM_BASE_URL)
+    state_poll_interval: float = Field(default=_STATE_POLL_INTERVAL)
+    retention_limit: int = Field(default=_RETENTION_LIMIT)
     metrics_dirname: str = "metrics"
     replays_dirname: str = "replays"
 
+    @cached_property
+    def examples_dir_abs(self) -> Path:
+        return self.examples_dir.resolve()
+
 
 @lru_cache
 def get_settings() -> Settings:
     settings = Settings()
-    settings.data_dir.mkdir(parents=True, exist_ok=True)
-    (settings.data_dir / settings.replays_dirname).mkdir(parents=True, exist_ok=True)
-    (settings.data_dir / settings.metrics_dirname).mkdir(parents=True, exist_ok=True)
-    settings.experiments_dir.mkdir(parents=True, exist_ok=True)
+    ensure_dir(settings.data_dir / settings.replays_dirname)
+    ensure_dir(settings.data_dir / settings.metrics_dirname)
+    ensure_dir(settings.experiments_dir)
     return settings
+
+
+def ensure_dir(path: Path) -> None:
+    key = str(path)
+    if key in _ENSURED_DIRS:
+        return
+    path.mkdir(parents=True, exist_ok=True)
+    _ENSURED_DIRS.add(key)
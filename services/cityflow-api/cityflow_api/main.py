@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import asyncio
+import copy
 import hashlib
-import json
 import logging
+import os
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Awaitable, Callable, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
 
+import orjson
 from fastapi import (
     FastAPI,
     HTTPException,
@@ -15,9 +19,9 @@ from fastapi import (
     WebSocket,
     WebSocketDisconnect,
 )
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 
-from .config import get_settings
+from .config import Settings, ensure_dir, get_settings
 from .models import (
     ControlResponsePayload,
     MetricsFormat,
@@ -27,15 +31,24 @@ from .models import (
     ReplaysResponse,
     RunRequestPayload,
     RunResponsePayload,
+    SimStatePayload,
     TagRequest,
 )
-from .presets import list_presets
-from .sim_client import SimClient
+from .presets import get_preset, list_preset_ids
+from .sim_client import SimClient, get_sim_client
 from .state_stream import StateBroadcaster, StatePoller
 from .storage import RunStore
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Stand-in for "no simulator state yet"; frozen, so safe to share across requests.
+_NO_STATE = SimStatePayload(status="idle", t=0, speed_hz=0)
+
+# Raw base CityFlow config bytes keyed by path, tagged with the (mtime_ns, size) they were read at.
+_BASE_CONFIG_CACHE: Dict[str, tuple[int, int, bytes]] = {}
+
 
 class APIError(Exception):
     def __init__(self, status_code: int, error_code: str, message: str):
@@ -45,33 +58,61 @@ class APIError(Exception):
         super().__init__(message)
 
 
-def create_app() -> FastAPI:
+@dataclass
+class _Services:
+    store: RunStore
+    sim_client: SimClient
+    broadcaster: StateBroadcaster
+    poller: StatePoller
+    active_apps: int = 0
+
+
+@lru_cache(maxsize=1)
+def _build_services(pid: int) -> _Services:
+    # Keyed on the pid so forked workers build their own; one poller per process otherwise.
     settings = get_settings()
     store = RunStore(settings)
-    sim_client = SimClient(settings.sim_base_url)
+    sim_client = get_sim_client(settings.sim_base_url)
     broadcaster = StateBroadcaster()
     poller = StatePoller(settings, sim_client, store, broadcaster)
+    return _Services(store=store, sim_client=sim_client, broadcaster=broadcaster, poller=poller)
 
-    app = FastAPI(title="CityFlow API", version="0.1.0")
+
+def create_app() -> FastAPI:
+    settings = get_settings()
+    services = _build_services(os.getpid())
+    store = services.store
+    sim_client = services.sim_client
+    broadcaster = services.broadcaster
+    poller = services.poller
+
+    app = FastAPI(title="CityFlow API", version="0.1.0", default_response_class=ORJSONResponse)
 
     @app.on_event("startup")
     async def _startup() -> None:  # pragma: no cover - FastAPI hook
+        services.active_apps += 1
+        await asyncio.to_thread(_warm_caches, settings)
+        await store.start()
         await poller.start()
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:  # pragma: no cover - FastAPI hook
+        services.active_apps -= 1
+        if services.active_apps > 0:
+            return
         await poller.stop()
+        await store.stop()
         await sim_client.close()
 
     @app.exception_handler(APIError)
-    async def api_error_handler(_, exc: APIError) -> JSONResponse:  # pragma: no cover
-        return JSONResponse(
+    async def api_error_handler(_, exc: APIError) -> ORJSONResponse:  # pragma: no cover
+        return ORJSONResponse(
             status_code=exc.status_code,
             content={"ok": False, "error_code": exc.error_code, "message": exc.message},
         )
 
     @app.exception_handler(HTTPException)
-    async def http_error_handler(_, exc: HTTPException) -> JSONResponse:  # pragma: no cover
+    async def http_error_handler(_, exc: HTTPException) -> ORJSONResponse:  # pragma: no cover
         detail = exc.detail
         if isinstance(detail, dict) and detail.get("ok") is False:
             content = detail
@@ -81,12 +122,12 @@ def create_app() -> FastAPI:
                 "error_code": "http_error",
                 "message": detail if isinstance(detail, str) else "HTTP error",
             }
-        return JSONResponse(status_code=exc.status_code, content=content)
+        return ORJSONResponse(status_code=exc.status_code, content=content)
 
     @app.exception_handler(Exception)
-    async def unhandled_exception_handler(_, exc: Exception) -> JSONResponse:  # pragma: no cover
+    async def unhandled_exception_handler(_, exc: Exception) -> ORJSONResponse:  # pragma: no cover
         logger.exception("Unhandled API error: %s", exc)
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={
                 "ok": False,
@@ -102,7 +143,7 @@ def create_app() -> FastAPI:
     @app.get("/scenarios", response_model=PresetListResponse)
     async def get_scenarios() -> PresetListResponse:
         try:
-            presets = list_presets(settings)
+            preset_ids = list_preset_ids(settings)
         except HTTPException as exc:
             detail = exc.detail if isinstance(exc.detail, dict) else {}
             message = detail.get("message") or str(detail) or "Preset discovery failed."
@@ -111,37 +152,27 @@ def create_app() -> FastAPI:
         except Exception as exc:  # pragma: no cover - defensive logging
             logger.warning("Unexpected preset discovery error: %s", exc)
             return PresetListResponse(ok=False, items=[], error=str(exc))
-        return PresetListResponse(items=sorted(presets.keys()))
+        return PresetListResponse(items=preset_ids)
 
     @app.post("/run", response_model=RunResponsePayload)
     async def start_run(payload: RunRequestPayload) -> RunResponsePayload:
-        logger.info("Received /run payload: %s", payload.model_dump(by_alias=True, exclude_none=True))
-        try:
-            presets = list_presets(settings)
-        except HTTPException as exc:
-            detail = exc.detail if isinstance(exc.detail, dict) else {}
-            raise APIError(
-                exc.status_code,
-                detail.get("error_code", "preset_discovery_failed"),
-                detail.get("message", "Preset discovery failed."),
-            ) from exc
-        except Exception as exc:
-            raise APIError(500, "preset_discovery_failed", f"Failed to load presets: {exc}") from exc
-
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Received /run payload: %s", payload.model_dump(by_alias=True, exclude_none=True))
         preset_key = payload.preset_id or payload.id
-        available_ids = sorted(presets.keys())
         if not preset_key:
-            message = "preset_id (or preset) must be provided."
-            if available_ids:
-                message = f"{message} Available presets: {', '.join(available_ids)}"
-            raise APIError(400, "preset_missing", message)
+            raise APIError(
+                400,
+                "preset_missing",
+                _with_available_presets("preset_id (or preset) must be provided."),
+            )
 
-        preset = presets.get(preset_key)
+        preset = _discover(lambda: get_preset(settings, preset_key))
         if not preset:
-            message = f"Preset '{preset_key}' not found."
-            if available_ids:
-                message = f"{message} Available presets: {', '.join(available_ids)}"
-            raise APIError(404, "preset_not_found", message)
+            raise APIError(
+                404,
+                "preset_not_found",
+                _with_available_presets(f"Preset '{preset_key}' not found."),
+            )
 
         steps = payload.steps or preset.steps
         speed_hz = payload.speed_hz or 10
@@ -162,7 +193,7 @@ def create_app() -> FastAPI:
                 base_config=Path(preset.config),
                 overrides=preset.params,
                 destination=store.config_copy_path(run_meta.run_id),
-                examples_dir=settings.examples_dir,
+                examples_dir=settings.examples_dir_abs,
                 run_dir=run_meta.run_dir,
             )
             await store.attach_generated_config(run_meta.run_id, run_config_path, config_hash)
@@ -222,13 +253,15 @@ def create_app() -> FastAPI:
         return ReplaysResponse(items=store.list_runs())
 
     @app.get("/replays/{run_id}")
-    async def get_replay(run_id: str, limit: Optional[int] = Query(default=None, ge=1, le=5000)) -> dict:
+    async def get_replay(run_id: str, limit: Optional[int] = Query(default=None, ge=1, le=5000)):
         if not store.get(run_id):
             raise APIError(404, "run_not_found", f"Run '{run_id}' not found.")
-        frames = store.get_replay(run_id)
         if limit:
-            frames = frames[:limit]
-        return {"ok": True, "run_id": run_id, "frames": frames}
+            frames = await store.get_replay(run_id, limit)
+            return {"ok": True, "run_id": run_id, "frames": frames}
+        # Flush here on the loop; Starlette iterates the sync generator on a worker thread.
+        store.flush_run(run_id)
+        return StreamingResponse(_stream_replay(run_id), media_type="application/json")
 
     @app.get("/metrics")
     async def get_metrics(
@@ -242,9 +275,9 @@ def create_app() -> FastAPI:
         if not store.get(target_run_id):
             raise APIError(404, "run_not_found", f"Run '{target_run_id}' not found.")
         if format == "csv":
-            csv_body = store.load_metrics_csv(target_run_id)
+            csv_body = await store.load_metrics_csv(target_run_id)
             return PlainTextResponse(csv_body, media_type="text/csv")
-        records = store.load_metrics(target_run_id)
+        records = await store.load_metrics(target_run_id)
         return MetricsResponse(ok=True, run_id=target_run_id, records=records)
 
     @app.post("/tags")
@@ -267,24 +300,24 @@ def create_app() -> FastAPI:
         return {"ok": True, "limit": payload.limit}
 
     @app.get("/state")
-    async def get_state_snapshot() -> dict:
+    async def get_state_snapshot() -> Response:
         latest = broadcaster.latest()
-        state = latest.model_dump() if latest else None
-        return {"ok": True, "state": state}
+        state = latest.json_frame() if latest else "null"
+        return Response(content=f'{{"ok":true,"state":{state}}}', media_type="application/json")
 
     @app.websocket("/ws/state")
     async def ws_state(socket: WebSocket) -> None:
         await socket.accept()
         await poller.client_connected()
-        queue = await broadcaster.subscribe()
+        slot = await broadcaster.subscribe()
         try:
             while True:
-                state = await queue.get()
-                await socket.send_json(state.model_dump())
+                frame = await slot.get()
+                await socket.send_bytes(frame)
         except WebSocketDisconnect:
             pass
         finally:
-            await broadcaster.unsubscribe(queue)
+            await broadcaster.unsubscribe(slot)
             await poller.client_disconnected()
 
     async def _forward_control(
@@ -295,18 +328,40 @@ def create_app() -> FastAPI:
         except Exception as exc:
             raise APIError(502, "sim_unreachable", str(exc)) from exc
         _ensure_sim_ok(response)
-        latest = broadcaster.latest()
-        status = response.get("status") or (latest.status if latest else "idle")
-        t_value = response.get("t") or (latest.t if latest else 0)
-        speed_value = response.get("speed_hz") or (latest.speed_hz if latest else 0)
-        run_id = latest.run_id if latest else None
+        latest = broadcaster.latest() or _NO_STATE
         return ControlResponsePayload(
-            status=status,
-            run_id=run_id,
-            t=t_value,
-            speed_hz=speed_value,
+            status=response.get("status") or latest.status,
+            run_id=latest.run_id,
+            t=response.get("t") or latest.t,
+            speed_hz=response.get("speed_hz") or latest.speed_hz,
         )
 
+    def _stream_replay(run_id: str) -> Iterator[bytes]:
+        # Same envelope as the limited response, but frames are copied straight from disk.
+        yield b'{"ok":true,"run_id":' + orjson.dumps(run_id) + b',"frames":['
+        for index, line in enumerate(store.iter_replay_lines(run_id)):
+            yield line if index == 0 else b"," + line
+        yield b"]}"
+
+    def _discover(fn: Callable[[], T]) -> T:
+        try:
+            return fn()
+        except HTTPException as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {}
+            raise APIError(
+                exc.status_code,
+                detail.get("error_code", "preset_discovery_failed"),
+                detail.get("message", "Preset discovery failed."),
+            ) from exc
+        except Exception as exc:
+            raise APIError(500, "preset_discovery_failed", f"Failed to load presets: {exc}") from exc
+
+    def _with_available_presets(message: str) -> str:
+        available_ids = _discover(lambda: list_preset_ids(settings))
+        if available_ids:
+            message = f"{message} Available presets: {', '.join(available_ids)}"
+        return message
+
     def _ensure_sim_ok(response: Dict[str, Any]) -> None:
         if isinstance(response, dict) and response.get("ok") is False:
             raise APIError(
@@ -318,6 +373,28 @@ def create_app() -> FastAPI:
     return app
 
 
+def _warm_caches(settings: Settings) -> None:
+    # Pay preset discovery and base config parsing at boot instead of on the first /run.
+    # Each preset is loaded on its own, so one broken file neither stops the warm-up nor stays
+    # listed by /scenarios: its failure is cached and list_preset_ids skips it.
+    try:
+        preset_ids = list_preset_ids(settings)
+    except Exception as exc:  # pragma: no cover - defensive logging
+        logger.warning("Preset warm-up failed: %s", exc)
+        return
+    for preset_id in preset_ids:
+        try:
+            preset = get_preset(settings, preset_id)
+        except HTTPException:
+            continue  # already logged by the preset loader
+        if preset is None:
+            continue
+        try:
+            orjson.loads(_read_base_config(Path(preset.config)))
+        except (OSError, orjson.JSONDecodeError) as exc:
+            logger.warning("Base config for preset '%s' could not be loaded: %s", preset.id, exc)
+
+
 def _build_run_config(
     base_config: Path,
     overrides: Dict[str, Any],
@@ -325,38 +402,60 @@ def _build_run_config(
     examples_dir: Path,
     run_dir: Path,
 ) -> tuple[Path, str]:
-    destination.parent.mkdir(parents=True, exist_ok=True)
-    if not base_config.exists():
-        raise FileNotFoundError(f"Config file '{base_config}' does not exist.")
-    with base_config.open("r", encoding="utf-8") as fh:
-        config = json.load(fh)
+    ensure_dir(destination.parent)
+    # orjson.loads always returns a fresh dict, so merging below never touches the cache.
+    config = orjson.loads(_read_base_config(base_config))
     merged = _deep_merge(config, overrides or {})
-    examples_abs = examples_dir.resolve()
-    run_dir_abs = run_dir.resolve()
-    run_dir_abs.mkdir(parents=True, exist_ok=True)
-    merged["dir"] = str(examples_abs)
-    _ensure_absolute_source_files(merged, examples_abs)
+    # abspath is pure string work; run dirs are created by RunStore so no symlink resolution is needed.
+    run_dir_abs = Path(os.path.abspath(run_dir))
+    ensure_dir(run_dir_abs)
+    merged["dir"] = str(examples_dir)
+    _ensure_absolute_source_files(merged, examples_dir)
     merged["saveReplay"] = True
     merged["roadnetLogFile"] = str(run_dir_abs / "roadnet.json")
     merged["replayLogFile"] = str(run_dir_abs / "replay.txt")
-    body = json.dumps(merged, indent=2)
-    destination.write_text(body)
-    config_hash = hashlib.sha256(json.dumps(merged, sort_keys=True).encode("utf-8")).hexdigest()
+    # Serialise once with sorted keys so the written file doubles as the canonical hash input.
+    body = orjson.dumps(
+        merged,
+        option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+    )
+    destination.write_bytes(body)
+    # Identity fingerprint only, not a security boundary; blake2b is faster than sha256 here.
+    config_hash = hashlib.blake2b(body, digest_size=16).hexdigest()
     return destination, config_hash
 
 
+def _read_base_config(path: Path) -> bytes:
+    key = str(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        _BASE_CONFIG_CACHE.pop(key, None)
+        raise FileNotFoundError(f"Config file '{path}' does not exist.") from None
+    cached = _BASE_CONFIG_CACHE.get(key)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    raw = path.read_bytes()
+    _BASE_CONFIG_CACHE[key] = (stat.st_mtime_ns, stat.st_size, raw)
+    return raw
+
+
 def _deep_merge(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    # Merges into ``base`` in place (callers pass a freshly parsed config) but never aliases
+    # containers from ``overrides``, so cached preset params stay untouched across runs.
     if not overrides:
         return base
-    for key, value in overrides.items():
-        if (
-            key in base
-            and isinstance(base[key], dict)
-            and isinstance(value, dict)
-        ):
-            base[key] = _deep_merge(base[key], value)
-        else:
-            base[key] = value
+    stack = [(base, overrides)]
+    while stack:
+        dst, src = stack.pop()
+        for key, value in src.items():
+            current = dst.get(key)
+            if isinstance(current, dict) and isinstance(value, dict):
+                stack.append((current, value))
+            elif isinstance(value, (dict, list)):
+                dst[key] = copy.deepcopy(value)
+            else:
+                dst[key] = value
     return base
 
 
@@ -369,6 +468,12 @@ def _ensure_absolute_file(config: Dict[str, Any], key: str, base_dir: Path) -> N
     value = config.get(key)
     if not value:
         return
+    config[key] = _absolute_source_file(str(base_dir), value)
+
+
+@lru_cache(maxsize=256)
+def _absolute_source_file(base_dir: str, value: str) -> str:
     path_value = Path(value)
-    if not path_value.is_absolute():
-        config[key] = str((base_dir / path_value).resolve())
+    if path_value.is_absolute():
+        return value
+    return str((Path(base_dir) / path_value).resolve())
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any, Dict, Literal, Optional
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 
 
 class APIErrorResponse(BaseModel):
@@ -98,6 +98,20 @@ class SimStatePayload(BaseModel):
     step_limit: Optional[int] = None
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Frozen so the cached JSON frame can never go stale once the poller publishes it.
+    model_config = ConfigDict(frozen=True)
+
+    _json_frame: Optional[str] = PrivateAttr(default=None)
+
+    def json_frame(self) -> str:
+        if self._json_frame is None:
+            self._json_frame = self.model_dump_json()
+        return self._json_frame
+
+
+class SimStateEnvelope(BaseModel):
+    state: Optional[SimStatePayload] = None
+
 
 class MetricsRecord(BaseModel):
     t: int
@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import json
 import logging
+import os
+import re
+import threading
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import yaml
 from fastapi import HTTPException
@@ -12,40 +15,140 @@ from pydantic import ValidationError
 from .config import Settings
 from .models import PresetModel
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # pragma: no cover - PyYAML built without libyaml
+    from yaml import SafeLoader as _YamlLoader
+
 logger = logging.getLogger(__name__)
 
+_PRESET_SUFFIXES = (".yaml", ".yml")
+
+# Parsed presets keyed by file path, tagged with the (mtime_ns, size) they were loaded from.
+_PRESET_CACHE: Dict[Path, Tuple[int, int, PresetModel]] = {}
+# Load errors keyed like _PRESET_CACHE, so a broken file is parsed once per version, not per call.
+_PRESET_FAILURES: Dict[Path, Tuple[int, int, HTTPException]] = {}
+# Preset ids sniffed from file headers for /scenarios, keyed like _PRESET_CACHE.
+_PRESET_ID_CACHE: Dict[Path, Tuple[int, int, Optional[str]]] = {}
+_PRESET_CACHE_LOCK = threading.Lock()
+
+_PRESET_HEADER_BYTES = 4096
+_PRESET_ID_RE = re.compile(rb"^id:[ \t]*['\"]?([\w\-]+)['\"]?[ \t]*(?:#.*)?\r?$", re.MULTILINE)
+
 
 def list_presets(settings: Settings) -> Dict[str, PresetModel]:
-    experiments_dir = settings.experiments_dir
-    experiments_abs = experiments_dir.resolve()
+    entries = _scan_preset_files(settings.experiments_dir)
+    _forget_missing(entries, _PRESET_CACHE, _PRESET_FAILURES)
     presets: Dict[str, PresetModel] = {}
-    candidates: List[Path] = []
-    for pattern in ("*.yaml", "*.yml"):
-        candidates.extend(sorted(experiments_dir.glob(pattern)))
-    unique_paths: List[Path] = []
-    seen: set[str] = set()
-    for path in candidates:
-        resolved = str(path.resolve())
-        if resolved in seen:
-            continue
-        seen.add(resolved)
-        unique_paths.append(path)
-    unique_paths.sort(key=lambda p: str(p))
-    logger.info(
-        "Discovering presets in %s; files: %s",
-        experiments_abs,
-        [str(path.resolve()) for path in unique_paths],
-    )
-    for path in unique_paths:
-        preset = _load_single(settings, path)
+    for path, mtime_ns, size in entries:
+        preset = _load_cached(settings, path, mtime_ns, size)
         presets[preset.id] = preset
     return presets
 
 
+def list_preset_ids(settings: Settings) -> List[str]:
+    # Ids come from each file's header. A file is fully parsed only when its header has no
+    # plain id line; one whose full load already failed (e.g. at warm-up or on /run) is skipped.
+    entries = _scan_preset_files(settings.experiments_dir)
+    _forget_missing(entries, _PRESET_ID_CACHE, _PRESET_FAILURES)
+    ids: set[str] = set()
+    for path, mtime_ns, size in entries:
+        with _PRESET_CACHE_LOCK:
+            cached_id = _PRESET_ID_CACHE.get(path)
+            cached_preset = _PRESET_CACHE.get(path)
+            failure = _PRESET_FAILURES.get(path)
+        if failure and failure[0] == mtime_ns and failure[1] == size:
+            continue
+        if cached_preset and cached_preset[0] == mtime_ns and cached_preset[1] == size:
+            preset_id: Optional[str] = cached_preset[2].id
+        elif cached_id and cached_id[0] == mtime_ns and cached_id[1] == size:
+            preset_id = cached_id[2]
+        else:
+            preset_id = _sniff_preset_id(path)
+            if preset_id is None:
+                # Header did not yield a plain top-level id; fall back to a full, validated parse.
+                try:
+                    preset_id = _load_cached(settings, path, mtime_ns, size).id
+                except HTTPException:
+                    preset_id = None
+            with _PRESET_CACHE_LOCK:
+                _PRESET_ID_CACHE[path] = (mtime_ns, size, preset_id)
+        if preset_id is not None:
+            ids.add(preset_id)
+    return sorted(ids)
+
+
+def get_preset(settings: Settings, preset_id: str) -> Optional[PresetModel]:
+    # Only files whose header id matches are loaded, so a broken unrelated preset never fails
+    # this lookup. The directory is rescanned only when no known file yields the id.
+    preset = _find_preset(settings, preset_id)
+    if preset is None:
+        list_preset_ids(settings)
+        preset = _find_preset(settings, preset_id)
+    return preset
+
+
+def _find_preset(settings: Settings, preset_id: str) -> Optional[PresetModel]:
+    with _PRESET_CACHE_LOCK:
+        candidates = {path for path, (_, _, cached_id) in _PRESET_ID_CACHE.items() if cached_id == preset_id}
+        candidates.update(path for path, (_, _, preset) in _PRESET_CACHE.items() if preset.id == preset_id)
+    # Later file names win, as in list_presets.
+    for path in sorted(candidates, reverse=True):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        preset = _load_cached(settings, path, stat.st_mtime_ns, stat.st_size)
+        if preset.id == preset_id:
+            return preset
+    return None
+
+
+def _load_cached(settings: Settings, path: Path, mtime_ns: int, size: int) -> PresetModel:
+    with _PRESET_CACHE_LOCK:
+        cached = _PRESET_CACHE.get(path)
+        failure = _PRESET_FAILURES.get(path)
+    if cached and cached[0] == mtime_ns and cached[1] == size:
+        return cached[2]
+    if failure and failure[0] == mtime_ns and failure[1] == size:
+        raise failure[2]
+    logger.info("Loading preset file %s", path)
+    try:
+        preset = _load_single(settings, path)
+    except HTTPException as exc:
+        logger.warning("Invalid preset file %s: %s", path, exc.detail)
+        with _PRESET_CACHE_LOCK:
+            _PRESET_CACHE.pop(path, None)
+            _PRESET_FAILURES[path] = (mtime_ns, size, exc)
+        raise
+    with _PRESET_CACHE_LOCK:
+        _PRESET_FAILURES.pop(path, None)
+        _PRESET_CACHE[path] = (mtime_ns, size, preset)
+    return preset
+
+
+def _forget_missing(entries: List[Tuple[Path, int, int]], *caches: Dict[Path, Any]) -> None:
+    present = {path for path, _, _ in entries}
+    with _PRESET_CACHE_LOCK:
+        for cache in caches:
+            for path in [path for path in cache if path not in present]:
+                del cache[path]
+
+
+def _sniff_preset_id(path: Path) -> Optional[str]:
+    with path.open("rb") as fh:
+        header = fh.read(_PRESET_HEADER_BYTES)
+    match = _PRESET_ID_RE.search(header)
+    return match.group(1).decode("utf-8") if match else None
+
+
 def load_preset(settings: Settings, preset_id: str) -> PresetModel:
-    preset_files: List[Path] = []
-    for pattern in (f"{preset_id}.yaml", f"{preset_id}.yml"):
-        preset_files.extend(settings.experiments_dir.glob(pattern))
+    by_name = {path.name: path for path, _, _ in _scan_preset_files(settings.experiments_dir)}
+    preset_files = [
+        by_name[name]
+        for name in (f"{preset_id}{suffix}" for suffix in _PRESET_SUFFIXES)
+        if name in by_name
+    ]
     if not preset_files:
         raise HTTPException(
             status_code=400,
@@ -54,13 +157,28 @@ def load_preset(settings: Settings, preset_id: str) -> PresetModel:
     return _load_single(settings, preset_files[0])
 
 
+def _scan_preset_files(experiments_dir: Path) -> List[Tuple[Path, int, int]]:
+    # One readdir for both suffixes; scandir yields each file once so no dedup pass is needed.
+    entries: List[Tuple[Path, int, int]] = []
+    with os.scandir(experiments_dir) as it:
+        for entry in it:
+            if not entry.name.endswith(_PRESET_SUFFIXES) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((Path(entry.path), stat.st_mtime_ns, stat.st_size))
+    entries.sort(key=lambda item: item[0].name)
+    return entries
+
+
 def _load_single(settings: Settings, path: Path) -> PresetModel:
-    with path.open("r", encoding="utf-8", newline="") as fh:
-        data = yaml.safe_load(fh) or {}
     try:
+        with path.open("r", encoding="utf-8", newline="") as fh:
+            data = yaml.load(fh, Loader=_YamlLoader) or {}
+        if not isinstance(data, dict):
+            raise ValueError("top level must be a mapping")
         preset = PresetModel(**data)
-    except ValidationError as exc:
-        errors = exc.errors()
+    except (yaml.YAMLError, ValueError) as exc:
+        errors = exc.errors() if isinstance(exc, ValidationError) else []
         reason = errors[0].get("msg", str(exc)) if errors else str(exc)
         message = f"Preset file '{path.name}' is invalid: {reason}"
         raise HTTPException(
@@ -75,8 +193,8 @@ def _load_single(settings: Settings, path: Path) -> PresetModel:
     config_path = Path(preset.config)
     if not config_path.is_absolute():
         base_dir = settings.examples_dir.parent
-        config_path = (base_dir / preset.config).resolve()
-    if not config_path.exists():
+        config_path = Path(os.path.abspath(base_dir / preset.config))
+    if not os.path.exists(config_path):
         raise HTTPException(
             status_code=400,
             detail={
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Any, Optional
 
 import httpx
@@ -10,7 +11,17 @@ class SimClient:
 
     def __init__(self, base_url: str, timeout: float = 10.0):
         self.base_url = base_url.rstrip("/")
-        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=timeout)
+        self.timeout = timeout
+        self._client = self._build_client()
+
+    def _build_client(self) -> httpx.AsyncClient:
+        # Keep connections to the simulator warm between polls and control calls.
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60),
+            retries=1,
+        )
+        return httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, transport=transport)
 
     async def start_run(self, payload: dict[str, Any]) -> dict[str, Any]:
         return await self._request("POST", "/run", json=payload)
@@ -39,6 +50,8 @@ class SimClient:
             raise
 
     async def _request(self, method: str, url: str, **kwargs: Any) -> dict[str, Any]:
+        if self._client.is_closed:
+            self._client = self._build_client()
         response = await self._client.request(method, url, **kwargs)
         response.raise_for_status()
         if response.content:
@@ -47,3 +60,8 @@ class SimClient:
 
     async def close(self) -> None:
         await self._client.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_sim_client(base_url: str) -> SimClient:
+    return SimClient(base_url)
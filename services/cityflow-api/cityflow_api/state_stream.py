@@ -1,63 +1,131 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import logging
-from typing import Any, Optional
+import time
+import zlib
+from typing import Any, Optional, Tuple
 from urllib.parse import urlparse, urlunparse
 
 import httpx
+import orjson
 from pydantic import ValidationError
 from websockets.client import connect as ws_connect
 
 from .config import Settings
-from .models import SimStatePayload
+from .models import SimStateEnvelope, SimStatePayload
 from .sim_client import SimClient
 from .storage import RunStore
 
 
 logger = logging.getLogger(__name__)
 
+# Full-city state frames easily exceed websockets' 1 MiB default; read them in large chunks.
+_SIM_WS_MAX_FRAME_BYTES = 8 * 1024 * 1024
+_SIM_WS_READ_LIMIT = 1 << 20
+
+# Frames are zlib-compressed once and shared by every subscriber; speed over ratio at 10-20 Hz.
+_FRAME_COMPRESSION_LEVEL = 1
+
+
+def _compress_frame(frame: str) -> bytes:
+    return zlib.compress(frame.encode("utf-8"), _FRAME_COMPRESSION_LEVEL)
+
+
+class LatestSlot:
+    """Single-value mailbox for one subscriber; a newer frame overwrites an unread one.
+
+    Frames are lane deltas against the previous publish. A subscriber that missed one
+    (a newer frame overwrote it unread) gets the full state next, so it never applies a
+    delta to a base it has not seen.
+    """
+
+    def __init__(self, broadcaster: StateBroadcaster) -> None:
+        self._broadcaster = broadcaster
+        self._state: Optional[SimStatePayload] = None
+        self._delta: Optional[bytes] = None
+        self._needs_full = True
+        self._event = asyncio.Event()
+
+    def set(self, state: SimStatePayload, delta: Optional[bytes]) -> None:
+        if self._event.is_set() or delta is None:
+            self._needs_full = True
+        self._state = state
+        self._delta = delta
+        self._event.set()
+
+    async def get(self) -> bytes:
+        await self._event.wait()
+        self._event.clear()
+        assert self._state is not None
+        if self._needs_full or self._delta is None:
+            self._needs_full = False
+            return self._broadcaster.full_frame(self._state)
+        return self._delta
+
 
 class StateBroadcaster:
+    """Fans simulator state out to subscribers as pre-compressed lane-delta JSON frames."""
+
     def __init__(self) -> None:
-        self._subscribers: set[asyncio.Queue[SimStatePayload]] = set()
+        self._subscribers: set[LatestSlot] = set()
         self._lock = asyncio.Lock()
         self._last_state: Optional[SimStatePayload] = None
+        self._full: Tuple[Optional[SimStatePayload], bytes] = (None, b"")
 
-    async def subscribe(self) -> asyncio.Queue[SimStatePayload]:
-        queue: asyncio.Queue[SimStatePayload] = asyncio.Queue(maxsize=1)
+    async def subscribe(self) -> LatestSlot:
+        slot = LatestSlot(self)
         async with self._lock:
-            self._subscribers.add(queue)
-            last_state = self._last_state
-        if last_state:
-            await queue.put(last_state)
-        return queue
+            self._subscribers.add(slot)
+            if self._last_state:
+                slot.set(self._last_state, None)
+        return slot
 
-    async def unsubscribe(self, queue: asyncio.Queue[SimStatePayload]) -> None:
+    async def unsubscribe(self, slot: LatestSlot) -> None:
         async with self._lock:
-            self._subscribers.discard(queue)
+            self._subscribers.discard(slot)
 
     async def publish(self, state: SimStatePayload) -> None:
         async with self._lock:
+            previous = self._last_state
             self._last_state = state
             subscribers = list(self._subscribers)
-        for queue in subscribers:
-            try:
-                queue.put_nowait(state)
-            except asyncio.QueueFull:
-                try:
-                    queue.get_nowait()
-                except asyncio.QueueEmpty:
-                    pass
-                try:
-                    queue.put_nowait(state)
-                except asyncio.QueueFull:
-                    continue
+        if not subscribers:
+            return
+        # Diff and serialise once per update rather than once per subscriber.
+        delta = self._delta_frame(previous, state)
+        for slot in subscribers:
+            slot.set(state, delta)
 
     def latest(self) -> Optional[SimStatePayload]:
         return self._last_state
 
+    def full_frame(self, state: SimStatePayload) -> bytes:
+        # Subscribers needing a resync usually want the same state, so compress it once.
+        cached_state, frame = self._full
+        if cached_state is not state:
+            frame = _compress_frame(f'{{"full":true,"state":{state.json_frame()}}}')
+            self._full = (state, frame)
+        return frame
+
+    @staticmethod
+    def _delta_frame(previous: Optional[SimStatePayload], state: SimStatePayload) -> Optional[bytes]:
+        # None means "send the full state": nothing to diff against, or lanes went away.
+        if previous is None or previous.run_id != state.run_id:
+            return None
+        before = previous.lanes
+        if len(before) != len(state.lanes):
+            return None
+        changed = {}
+        for lane_id, lane in state.lanes.items():
+            old = before.get(lane_id)
+            if old is None:
+                return None
+            if old != lane:
+                changed[lane_id] = lane
+        body = state.model_copy(update={"lanes": changed}).model_dump_json()
+        return _compress_frame(f'{{"full":false,"state":{body}}}')
+
 
 class StatePoller:
     def __init__(
@@ -78,11 +146,16 @@ class StatePoller:
         self._active_clients = 0
         self._clients_lock = asyncio.Lock()
         self._ws_connected = False
+        # Set only while some client is waiting and the WS feed is down; gates the HTTP poll loop.
+        # Created in start(): the poller outlives any one event loop (one per app lifespan).
+        self._need_fallback: Optional[asyncio.Event] = None
 
     async def start(self) -> None:
         if self._ws_task is None:
             self._ws_task = asyncio.create_task(self._run_ws())
         if self._fallback_task is None:
+            self._need_fallback = asyncio.Event()
+            self._update_fallback_gate()
             self._fallback_task = asyncio.create_task(self._run_http_fallback())
 
     async def stop(self) -> None:
@@ -99,18 +172,27 @@ class StatePoller:
     async def client_connected(self) -> None:
         async with self._clients_lock:
             self._active_clients += 1
+            self._update_fallback_gate()
 
     async def client_disconnected(self) -> None:
         async with self._clients_lock:
             if self._active_clients > 0:
                 self._active_clients -= 1
+            self._update_fallback_gate()
 
     async def _run_ws(self) -> None:
         backoff = 1.0
         try:
             while True:
                 try:
-                    async with ws_connect(self._ws_url, ping_interval=20, ping_timeout=20) as socket:
+                    async with ws_connect(
+                        self._ws_url,
+                        ping_interval=20,
+                        ping_timeout=20,
+                        max_size=_SIM_WS_MAX_FRAME_BYTES,
+                        read_limit=_SIM_WS_READ_LIMIT,
+                        compression=None,
+                    ) as socket:
                         self._set_ws_connected(True)
                         logger.info("Connected to simulator state stream at %s", self._ws_url)
                         backoff = 1.0
@@ -130,7 +212,11 @@ class StatePoller:
 
     async def _run_http_fallback(self) -> None:
         try:
+            need_fallback = self._need_fallback
+            if need_fallback is None:
+                return
             while True:
+                await need_fallback.wait()
                 await asyncio.sleep(self.settings.state_poll_interval)
                 if not self._should_poll_http():
                     continue
@@ -148,30 +234,45 @@ class StatePoller:
     def _should_poll_http(self) -> bool:
         if self._active_clients == 0 or self._ws_connected:
             return False
-        loop = asyncio.get_running_loop()
-        return (loop.time() - self._last_state_at) >= self.settings.state_poll_interval
+        return (time.monotonic() - self._last_state_at) >= self.settings.state_poll_interval
 
     async def _ingest_payload(self, payload: Any) -> None:
-        data = payload
         if isinstance(payload, (bytes, str)):
-            try:
-                data = json.loads(payload)
-            except json.JSONDecodeError:
-                logger.debug("Dropping malformed state payload: %s", payload)
-                return
-        if not isinstance(data, dict):
+            state = self._parse_frame(payload)
+        elif isinstance(payload, dict):
+            state = self._validate_state(payload)
+        else:
             return
+        if state is not None:
+            await self._process_state(state)
+
+    def _parse_frame(self, payload: bytes | str) -> Optional[SimStatePayload]:
+        # Validate the enveloped frame straight from JSON, skipping the intermediate dict.
+        try:
+            envelope = SimStateEnvelope.model_validate_json(payload)
+        except ValidationError as exc:
+            if any(error["type"] == "json_invalid" for error in exc.errors()):
+                logger.debug("Dropping malformed state payload: %s", payload)
+            else:
+                logger.warning("Invalid simulator state payload: %s", exc)
+            return None
+        if envelope.state is not None:
+            return envelope.state
+        # Bare (non-enveloped) state frame.
+        data = orjson.loads(payload)
+        return self._validate_state(data) if isinstance(data, dict) else None
+
+    def _validate_state(self, data: dict[str, Any]) -> Optional[SimStatePayload]:
         state_raw = data.get("state") or data
         if not isinstance(state_raw, dict):
-            return
-        await self._process_state(state_raw)
-
-    async def _process_state(self, state_raw: dict[str, Any]) -> None:
+            return None
         try:
-            state = SimStatePayload(**state_raw)
+            return SimStatePayload.model_validate(state_raw)
         except ValidationError as exc:
             logger.warning("Invalid simulator state payload: %s", exc)
-            return
+            return None
+
+    async def _process_state(self, state: SimStatePayload) -> None:
         run_id = state.run_id
         if run_id:
             meta = self.store.get(run_id)
@@ -185,7 +286,7 @@ class StatePoller:
                 if state.status != meta.status:
                     await self.store.mark_status(run_id, state.status)
         await self.broadcaster.publish(state)
-        self._last_state_at = asyncio.get_running_loop().time()
+        self._last_state_at = time.monotonic()
 
     @staticmethod
     def _build_ws_url(base_url: str) -> str:
@@ -197,3 +298,13 @@ class StatePoller:
 
     def _set_ws_connected(self, connected: bool) -> None:
         self._ws_connected = connected
+        self._update_fallback_gate()
+
+    def _update_fallback_gate(self) -> None:
+        need_fallback = self._need_fallback
+        if need_fallback is None:
+            return
+        if self._active_clients > 0 and not self._ws_connected:
+            need_fallback.set()
+        else:
+            need_fallback.clear()
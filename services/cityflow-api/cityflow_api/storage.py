@@ -3,16 +3,31 @@ from __future__ import annotations
 import asyncio
 import csv
 import io
-import json
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
+from io import BufferedWriter
+from itertools import islice
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
 import shutil
 
+import orjson
+from pydantic import TypeAdapter, ValidationError
+
 from .config import Settings
 from .models import MetricsRecord, RunInfo, SimStatePayload
 
+_WRITE_BUFFER_BYTES = 1 << 16
+_FLUSH_INTERVAL_S = 0.2
+_RUNS_INDEX_FILENAME = "runs_index.ndjson"
+_METRICS_ADAPTER = TypeAdapter(list[MetricsRecord])
+_METRICS_CSV_COLUMNS = ("t", "vehicle_count", "avg_speed", "avg_waiting", "throughput")
+_TERMINAL_STATUSES = ("completed", "error")
+
 
 @dataclass
 class RunMetadata:
@@ -75,18 +90,80 @@ class RunStore:
         self.settings = settings
         self.replays_dir = settings.data_dir / settings.replays_dirname
         self.metrics_dir = settings.data_dir / settings.metrics_dirname
+        # Append-only log of run.json snapshots (last line per run wins), read once at boot.
+        self.index_path = settings.data_dir / _RUNS_INDEX_FILENAME
+        # Guards run_id allocation and retention in create_run; other mutators run lock-free.
         self._lock = asyncio.Lock()
-        self._runs: Dict[str, RunMetadata] = {}
+        # One worker so run.json / index writes land in the order they were issued.
+        self._metadata_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="runstore-meta")
+        # Oldest run first, so retention pops from the front and listings read it backwards.
+        self._runs: OrderedDict[str, RunMetadata] = OrderedDict()
+        # Rendered metrics keyed by run_id, tagged with the ndjson (mtime_ns, size) they came from.
+        self._metrics_cache: Dict[str, Tuple[Tuple[int, int], list[MetricsRecord]]] = {}
+        self._csv_cache: Dict[str, Tuple[Tuple[int, int], bytes]] = {}
+        # Append handles for live runs' ndjson files, flushed in batches by _flush_loop. Only
+        # the event loop writes and flushes them; a worker thread sees one only after it is popped.
+        self._writers: Dict[str, Dict[Path, BufferedWriter]] = {}
+        self._flush_task: Optional[asyncio.Task[None]] = None
         self._load_existing_runs()
 
     def _load_existing_runs(self) -> None:
-        for run_file in self.replays_dir.glob("*/run.json"):
+        index_lines = -1
+        if self.index_path.exists():
+            index_lines = self._load_runs_index()
+        else:
+            for run_file in self.replays_dir.glob("*/run.json"):
+                try:
+                    data = orjson.loads(run_file.read_bytes())
+                    meta = RunMetadata.from_json(data)
+                    self._runs[meta.run_id] = meta
+                except Exception:
+                    continue
+        self._runs = OrderedDict(
+            (meta.run_id, meta) for meta in sorted(self._runs.values(), key=lambda x: x.started_at)
+        )
+        if index_lines == len(self._runs):
+            # Already one line per live run: no superseded snapshots, tombstones or junk.
+            return
+        # Compact the index down to one line per live run.
+        _atomic_write_bytes(
+            self.index_path,
+            b"".join(
+                orjson.dumps(meta.to_json(), option=orjson.OPT_APPEND_NEWLINE)
+                for meta in self._runs.values()
+            ),
+        )
+
+    def _load_runs_index(self) -> int:
+        lines = 0
+        with self.index_path.open("rb") as fh:
+            for line in fh:
+                lines += 1
+                try:
+                    data = orjson.loads(line)
+                    if data.get("deleted"):
+                        self._runs.pop(data["run_id"], None)
+                        continue
+                    meta = RunMetadata.from_json(data)
+                    self._runs[meta.run_id] = meta
+                except Exception:
+                    continue
+        return lines
+
+    async def start(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
             try:
-                data = json.loads(run_file.read_text())
-                meta = RunMetadata.from_json(data)
-                self._runs[meta.run_id] = meta
-            except Exception:
-                continue
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        writers = [writer for run_id in list(self._writers) for writer in self._pop_writers(run_id)]
+        await asyncio.to_thread(_close_all, writers)
 
     async def create_run(
         self,
@@ -106,7 +183,7 @@ class RunStore:
                 run_id = f"{base_run_id}_{suffix}"
                 suffix += 1
             run_dir = self.replays_dir / run_id
-            run_dir.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(run_dir.mkdir, parents=True, exist_ok=True)
             meta = RunMetadata(
                 run_id=run_id,
                 preset_id=preset_id,
@@ -120,51 +197,49 @@ class RunStore:
                 run_dir=run_dir,
             )
             self._runs[run_id] = meta
-            self._persist_metadata(meta)
-            self._enforce_retention_locked()
+            await self._persist_metadata(meta)
+            await self._enforce_retention_locked()
             return meta
 
     async def mark_status(self, run_id: str, status: str) -> None:
-        async with self._lock:
-            meta = self._runs.get(run_id)
-            if not meta:
-                return
-            meta.status = status
-            self._persist_metadata(meta)
+        meta = self._runs.get(run_id)
+        if not meta or meta.status == status:
+            return
+        meta.status = status
+        await self._persist_metadata(meta)
+        if status in _TERMINAL_STATUSES:
+            await asyncio.to_thread(_close_all, self._pop_writers(run_id))
 
     async def attach_generated_config(self, run_id: str, generated_path: Path, config_hash: str) -> None:
-        async with self._lock:
-            meta = self._runs.get(run_id)
-            if not meta:
-                return
-            meta.generated_config_path = str(generated_path)
-            meta.config_hash = config_hash
-            self._persist_metadata(meta)
+        meta = self._runs.get(run_id)
+        if not meta:
+            return
+        meta.generated_config_path = str(generated_path)
+        meta.config_hash = config_hash
+        await self._persist_metadata(meta)
 
     async def add_tag(self, run_id: str, tag: str) -> Optional[RunMetadata]:
-        async with self._lock:
-            meta = self._runs.get(run_id)
-            if not meta:
-                return None
-            if tag not in meta.tags:
-                meta.tags.append(tag)
-                self._persist_metadata(meta)
-            return meta
+        meta = self._runs.get(run_id)
+        if not meta:
+            return None
+        if tag not in meta.tags:
+            meta.tags.append(tag)
+            await self._persist_metadata(meta)
+        return meta
 
     async def remove_tag(self, run_id: str, tag: str) -> Optional[RunMetadata]:
-        async with self._lock:
-            meta = self._runs.get(run_id)
-            if not meta:
-                return None
-            if tag in meta.tags:
-                meta.tags.remove(tag)
-                self._persist_metadata(meta)
-            return meta
+        meta = self._runs.get(run_id)
+        if not meta:
+            return None
+        if tag in meta.tags:
+            meta.tags.remove(tag)
+            await self._persist_metadata(meta)
+        return meta
 
     def list_runs(self) -> list[RunInfo]:
         return [
             meta.to_info()
-            for meta in sorted(self._runs.values(), key=lambda x: x.started_at, reverse=True)
+            for meta in reversed(self._runs.values())
         ]
 
     def get(self, run_id: str) -> Optional[RunMetadata]:
@@ -176,95 +251,251 @@ class RunStore:
     def metrics_path(self, run_id: str) -> Path:
         return self.metrics_dir / f"{run_id}.ndjson"
 
+    def metrics_csv_path(self, run_id: str) -> Path:
+        return self.metrics_dir / f"{run_id}.csv"
+
     def config_copy_path(self, run_id: str) -> Path:
         return self.replays_dir / run_id / "config.generated.json"
 
     def write_replay_sample(self, run_id: str, state: SimStatePayload) -> None:
-        path = self.replay_path(run_id)
-        payload = state.model_dump()
-        with path.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(payload))
-            fh.write("\n")
+        # Reuse the frame already encoded for the broadcaster instead of dumping again.
+        writer = self._writer(run_id, self.replay_path(run_id))
+        writer.write(state.json_frame().encode("utf-8") + b"\n")
 
     def write_metrics_sample(self, run_id: str, state: SimStatePayload) -> MetricsRecord:
-        metrics = MetricsRecord(
-            t=state.t,
-            vehicle_count=state.vehicle_count,
-            avg_speed=state.metrics_live.avg_speed,
-            avg_waiting=state.metrics_live.avg_waiting,
-            throughput=state.metrics_live.throughput,
-        )
-        path = self.metrics_path(run_id)
-        with path.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(metrics.model_dump()))
-            fh.write("\n")
-        return metrics
-
-    def load_metrics(self, run_id: str) -> list[MetricsRecord]:
-        path = self.metrics_path(run_id)
-        if not path.exists():
+        # The state was validated on ingest, so skip revalidation and the model_dump walk.
+        live = state.metrics_live
+        fields = {
+            "t": state.t,
+            "vehicle_count": state.vehicle_count,
+            "avg_speed": live.avg_speed,
+            "avg_waiting": live.avg_waiting,
+            "throughput": live.throughput,
+        }
+        writer = self._writer(run_id, self.metrics_path(run_id))
+        writer.write(orjson.dumps(fields, option=orjson.OPT_APPEND_NEWLINE))
+        return MetricsRecord.model_construct(**fields)
+
+    def flush_run(self, run_id: str) -> None:
+        # Loop-only, like the writes: buffered writers must not be touched from two threads.
+        writers = self._writers.get(run_id)
+        if not writers:
+            return
+        meta = self._runs.get(run_id)
+        if meta is None or meta.status in _TERMINAL_STATUSES:
+            # A late sample reopened a finished (or deleted) run's file; close it again so
+            # handles do not pile up until stop(). close() flushes first.
+            _close_all(self._pop_writers(run_id))
+        else:
+            _flush_all(list(writers.values()))
+
+    def _writer(self, run_id: str, path: Path) -> BufferedWriter:
+        writers = self._writers.setdefault(run_id, {})
+        writer = writers.get(path)
+        if writer is None:
+            writer = writers[path] = open(path, "ab", buffering=_WRITE_BUFFER_BYTES)
+        return writer
+
+    def _pop_writers(self, run_id: str) -> list[BufferedWriter]:
+        return list(self._writers.pop(run_id, {}).values())
+
+    async def _flush_loop(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(_FLUSH_INTERVAL_S)
+                # Flushed on the loop: each writer holds at most one interval of samples, so
+                # this is a handful of write() calls, and never races the loop's own writes.
+                for run_id in list(self._writers):
+                    self.flush_run(run_id)
+        except asyncio.CancelledError:  # pragma: no cover - shutdown
+            return
+
+    async def load_metrics(self, run_id: str) -> list[MetricsRecord]:
+        self.flush_run(run_id)
+        return await asyncio.to_thread(self._load_metrics_sync, run_id)
+
+    async def load_metrics_csv(self, run_id: str) -> bytes:
+        self.flush_run(run_id)
+        return await asyncio.to_thread(self._load_metrics_csv_sync, run_id)
+
+    async def get_replay(self, run_id: str, limit: Optional[int] = None) -> list[dict]:
+        self.flush_run(run_id)
+        return await asyncio.to_thread(lambda: list(islice(self.iter_replay(run_id), limit)))
+
+    def _load_metrics_sync(self, run_id: str) -> list[MetricsRecord]:
+        key = self._metrics_file_key(run_id)
+        if key is None:
             return []
-        records: list[MetricsRecord] = []
-        with path.open("r", encoding="utf-8") as fh:
-            for line in fh:
-                line = line.strip()
-                if not line:
-                    continue
+        cached = self._metrics_cache.get(run_id)
+        if cached and cached[0] == key:
+            return list(cached[1])
+        lines = [line for line in self.metrics_path(run_id).read_bytes().splitlines() if line.strip()]
+        try:
+            # One pydantic-core pass over the whole file; no intermediate dicts.
+            records = _METRICS_ADAPTER.validate_json(b"[" + b",".join(lines) + b"]")
+        except ValidationError:
+            records = []
+            for line in lines:
                 try:
-                    data = json.loads(line)
-                    records.append(MetricsRecord(**data))
-                except Exception:
+                    records.append(MetricsRecord.model_validate_json(line))
+                except ValidationError:
                     continue
-        return records
+        self._metrics_cache[run_id] = (key, records)
+        return list(records)
+
+    def _load_metrics_csv_sync(self, run_id: str) -> bytes:
+        key = self._metrics_file_key(run_id)
+        if key is None:
+            return b""
+        cached = self._csv_cache.get(run_id)
+        if cached and cached[0] == key:
+            return cached[1]
+        # Completed runs never change, so their CSV is rendered once and kept next to the ndjson.
+        meta = self._runs.get(run_id)
+        completed = meta is not None and meta.status == "completed"
+        csv_path = self.metrics_csv_path(run_id)
+        body: Optional[bytes] = None
+        if completed:
+            try:
+                if csv_path.stat().st_mtime_ns >= key[0]:
+                    body = csv_path.read_bytes()
+            except FileNotFoundError:
+                pass
+        if body is None:
+            body = self._render_metrics_csv(self._load_metrics_sync(run_id))
+            if completed:
+                _atomic_write_bytes(csv_path, body)
+        self._csv_cache[run_id] = (key, body)
+        return body
 
-    def load_metrics_csv(self, run_id: str) -> str:
-        records = self.load_metrics(run_id)
+    def _render_metrics_csv(self, records: list[MetricsRecord]) -> bytes:
         if not records:
-            return ""
+            return b""
         buffer = io.StringIO()
-        writer = csv.DictWriter(
-            buffer, fieldnames=["t", "vehicle_count", "avg_speed", "avg_waiting", "throughput"]
+        writer = csv.writer(buffer)
+        writer.writerow(_METRICS_CSV_COLUMNS)
+        # Plain tuples into one writerows call: no per-row model_dump or dict lookups.
+        writer.writerows(
+            (r.t, r.vehicle_count, r.avg_speed, r.avg_waiting, r.throughput) for r in records
         )
-        writer.writeheader()
-        for record in records:
-            writer.writerow(record.model_dump())
-        return buffer.getvalue()
+        return buffer.getvalue().encode("utf-8")
 
-    def get_replay(self, run_id: str) -> list[dict]:
+    def _metrics_file_key(self, run_id: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.metrics_path(run_id).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def iter_replay(self, run_id: str) -> Iterator[dict]:
+        for line in self._iter_replay_raw(run_id):
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+
+    def iter_replay_lines(self, run_id: str) -> Iterator[bytes]:
+        for line in self._iter_replay_raw(run_id):
+            try:
+                orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+            yield line
+
+    def _iter_replay_raw(self, run_id: str) -> Iterator[bytes]:
+        # Callers flush_run() on the loop first; this may run on a worker thread.
         path = self.replay_path(run_id)
         if not path.exists():
-            return []
-        frames = []
-        with path.open("r", encoding="utf-8") as fh:
+            return
+        with path.open("rb") as fh:
             for line in fh:
                 line = line.strip()
-                if not line:
-                    continue
-                try:
-                    frames.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-        return frames
+                if line:
+                    yield line
 
     def set_retention(self, limit: int) -> None:
         self.settings = self.settings.model_copy(update={"retention_limit": limit})
 
-    def _persist_metadata(self, meta: RunMetadata) -> None:
-        path = meta.run_dir / "run.json"
-        path.write_text(json.dumps(meta.to_json(), indent=2))
+    async def _persist_metadata(self, meta: RunMetadata) -> None:
+        # Snapshot on the loop so the worker thread never sees a half-updated record.
+        payload = meta.to_json()
+        body = orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+        line = orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE)
+        await self._run_metadata_io(self._write_metadata, meta.run_dir / "run.json", body, line)
+
+    async def _run_metadata_io(self, func: Callable[..., None], *args: Any) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._metadata_executor, func, *args)
+
+    def _write_metadata(self, path: Path, body: bytes, index_line: bytes) -> None:
+        _atomic_write_bytes(path, body)
+        self._append_index(index_line)
 
-    def _enforce_retention_locked(self) -> None:
+    def _append_index(self, line: bytes) -> None:
+        with self.index_path.open("ab") as fh:
+            fh.write(line)
+
+    async def _enforce_retention_locked(self) -> None:
         limit = self.settings.retention_limit
         if limit <= 0:
             return
-        if len(self._runs) <= limit:
-            return
-        sorted_runs = sorted(self._runs.values(), key=lambda x: x.started_at)
-        for meta in sorted_runs[:-limit]:
-            run_dir = meta.run_dir
-            metrics_path = self.metrics_path(meta.run_id)
-            if run_dir.exists():
-                shutil.rmtree(run_dir, ignore_errors=True)
-            if metrics_path.exists():
-                metrics_path.unlink()
-            self._runs.pop(meta.run_id, None)
+        while len(self._runs) > limit:
+            _, meta = self._runs.popitem(last=False)
+            writers = self._pop_writers(meta.run_id)
+            self._metrics_cache.pop(meta.run_id, None)
+            self._csv_cache.pop(meta.run_id, None)
+            await asyncio.to_thread(
+                _remove_run_files,
+                writers,
+                meta.run_dir,
+                (self.metrics_path(meta.run_id), self.metrics_csv_path(meta.run_id)),
+            )
+            await self._run_metadata_io(
+                self._append_index,
+                orjson.dumps({"run_id": meta.run_id, "deleted": True}, option=orjson.OPT_APPEND_NEWLINE),
+            )
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    # Write beside the target and swap it in, so a crash or a concurrent reader never sees a
+    # truncated file. The temp name is unique, so two threads writing one path cannot collide.
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _flush_all(writers: list[BufferedWriter]) -> None:
+    for writer in writers:
+        if writer.closed:
+            continue
+        try:
+            writer.flush()
+        except OSError:  # pragma: no cover - disk IO guard
+            continue
+
+
+def _close_all(writers: list[BufferedWriter]) -> None:
+    for writer in writers:
+        try:
+            writer.close()
+        except OSError:  # pragma: no cover - disk IO guard
+            continue
+
+
+def _remove_run_files(writers: list[BufferedWriter], run_dir: Path, files: Tuple[Path, ...]) -> None:
+    _close_all(writers)
+    if run_dir.exists():
+        shutil.rmtree(run_dir, ignore_errors=True)
+    for path in files:
+        if path.exists():
+            path.unlink()
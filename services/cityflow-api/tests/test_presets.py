@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from fastapi import HTTPException
+
+from cityflow_api import presets
+from cityflow_api.config import Settings
+from cityflow_api.main import _warm_caches
+from cityflow_api.presets import get_preset, list_preset_ids
+
+PRESET = """id: {preset_id}
+config: examples/config.json
+steps: {steps}
+seed: 0
+"""
+
+
+class TestPresetLookup(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        root = Path(self._tmp.name)
+        (root / "examples").mkdir()
+        (root / "examples" / "config.json").write_text("{}")
+        self.experiments_dir = root / "experiments"
+        self.experiments_dir.mkdir()
+        self.settings = Settings(experiments_dir=self.experiments_dir, examples_dir=root / "examples")
+        self.forget_caches()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def forget_caches(self):
+        """Start cold, as a fresh process would"""
+        for cache in (presets._PRESET_CACHE, presets._PRESET_FAILURES, presets._PRESET_ID_CACHE):
+            cache.clear()
+
+    def write(self, name, text, mtime_ns=None):
+        path = self.experiments_dir / name
+        path.write_text(text)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_broken_file_does_not_block_lookup(self):
+        """A broken preset only fails its own lookup, cold or after another file changes"""
+        self.write("a_broken.yaml", "id: a_broken\nconfig: [unclosed\n")
+        self.write("b_good.yaml", PRESET.format(preset_id="b_good", steps=10))
+        self.assertEqual(get_preset(self.settings, "b_good").steps, 10)
+        self.write("b_good.yaml", PRESET.format(preset_id="b_good", steps=200), mtime_ns=1)
+        self.assertEqual(get_preset(self.settings, "b_good").steps, 200)
+        self.forget_caches()
+        self.assertEqual(get_preset(self.settings, "b_good").steps, 200)
+        self.assertIsNone(get_preset(self.settings, "missing"))
+        with self.assertRaises(HTTPException) as ctx:
+            get_preset(self.settings, "a_broken")
+        self.assertEqual(ctx.exception.detail["error_code"], "INVALID_PRESET")
+        self.assertEqual(list_preset_ids(self.settings), ["b_good"])
+
+    def test_listing_skips_failed_loads(self):
+        """Ids come from file headers; files whose full load failed are left out"""
+        self.write("good.yaml", PRESET.format(preset_id="good", steps=10))
+        self.write("broken_yaml.yaml", "id: broken_yaml\nconfig: [unclosed\n")
+        self.write("missing_steps.yaml", "id: missing_steps\nconfig: examples/config.json\nseed: 0\n")
+        self.write("no_id_line.yaml", "config: [unclosed\n")
+        # Header ids only: files with an id line are not parsed until something loads them.
+        self.assertEqual(list_preset_ids(self.settings), ["broken_yaml", "good", "missing_steps"])
+        self.assertEqual(presets._PRESET_CACHE, {})
+        _warm_caches(self.settings)
+        self.assertEqual(list_preset_ids(self.settings), ["good"])
+
+    def test_fixed_file_is_listed(self):
+        """A failed file is re-checked once it changes on disk"""
+        self.write("later.yaml", "config: [unclosed\n")
+        self.assertEqual(list_preset_ids(self.settings), [])
+        self.write("later.yaml", PRESET.format(preset_id="later", steps=10))
+        self.assertEqual(list_preset_ids(self.settings), ["later"])
+        self.assertEqual(get_preset(self.settings, "later").steps, 10)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+from cityflow_api.config import Settings
+from cityflow_api.models import SimStatePayload
+from cityflow_api.sim_client import SimClient
+from cityflow_api.state_stream import StateBroadcaster, StatePoller
+from cityflow_api.storage import RunStore
+
+
+def make_settings(data_dir):
+    return Settings(
+        data_dir=Path(data_dir),
+        experiments_dir=Path(data_dir) / "experiments",
+        examples_dir=Path(data_dir) / "examples",
+        # Nothing listens here: the WS feed stays down and the HTTP fallback is exercised.
+        sim_base_url="http://127.0.0.1:1",
+        state_poll_interval=0.01,
+    )
+
+
+def make_state(t, lanes, run_id="run"):
+    return SimStatePayload(
+        t=t,
+        run_id=run_id,
+        status="running",
+        lanes={lane_id: {"vehicles": vehicles, "waiting": 0} for lane_id, vehicles in lanes.items()},
+    )
+
+
+def decode(frame):
+    return json.loads(zlib.decompress(frame))
+
+
+def run_async(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+class TestStateBroadcaster(unittest.TestCase):
+
+    def test_delta_round_trip(self):
+        """A full frame then deltas rebuild every published state on the client"""
+        states = [
+            make_state(0, {"a": 0, "b": 0, "c": 0}),
+            make_state(1, {"a": 1, "b": 0, "c": 0}),
+            make_state(2, {"a": 1, "b": 2, "c": 3}),
+            make_state(3, {"a": 1, "b": 2, "c": 3}),
+        ]
+
+        async def scenario():
+            broadcaster = StateBroadcaster()
+            slot = await broadcaster.subscribe()
+            frames = []
+            for state in states:
+                await broadcaster.publish(state)
+                frames.append(decode(await slot.get()))
+            return frames
+
+        frames = run_async(scenario())
+        self.assertEqual([frame["full"] for frame in frames], [True, False, False, False])
+        self.assertEqual(list(frames[1]["state"]["lanes"]), ["a"])
+        self.assertEqual(frames[3]["state"]["lanes"], {})
+        client = frames[0]["state"]
+        for frame, state in zip(frames[1:], states[1:]):
+            client = dict(frame["state"], lanes={**client["lanes"], **frame["state"]["lanes"]})
+            self.assertEqual(client, json.loads(state.model_dump_json()))
+
+    def test_missed_frame_resyncs(self):
+        """A subscriber that missed a delta, or a run change, gets a full frame next"""
+        async def scenario():
+            broadcaster = StateBroadcaster()
+            slot = await broadcaster.subscribe()
+            await broadcaster.publish(make_state(0, {"a": 0, "b": 0}))
+            first = decode(await slot.get())
+            await broadcaster.publish(make_state(1, {"a": 1, "b": 0}))
+            await broadcaster.publish(make_state(2, {"a": 1, "b": 2}))
+            missed = decode(await slot.get())
+            await broadcaster.publish(make_state(3, {"a": 1, "b": 2}, run_id="other"))
+            new_run = decode(await slot.get())
+            late = await broadcaster.subscribe()
+            joined = decode(await late.get())
+            return first, missed, new_run, joined
+
+        first, missed, new_run, joined = run_async(scenario())
+        self.assertTrue(first["full"])
+        self.assertTrue(missed["full"])
+        self.assertEqual(missed["state"]["t"], 2)
+        self.assertEqual(missed["state"]["lanes"]["b"], {"vehicles": 2, "waiting": 0})
+        self.assertTrue(new_run["full"])
+        self.assertEqual(new_run["state"]["run_id"], "other")
+        self.assertTrue(joined["full"])
+        self.assertEqual(joined["state"]["t"], 3)
+
+
+class TestStatePoller(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.settings = make_settings(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_restart_on_new_event_loop(self):
+        """One poller serves several app lifespans, each on its own event loop"""
+        poller = StatePoller(
+            self.settings,
+            SimClient(self.settings.sim_base_url),
+            RunStore(self.settings),
+            StateBroadcaster(),
+        )
+
+        async def lifespan():
+            await poller.start()
+            # Let the fallback loop park on its gate before a client wakes it.
+            await asyncio.sleep(0.05)
+            await poller.client_connected()
+            await asyncio.sleep(0.05)
+            self.assertFalse(poller._fallback_task.done())
+            await poller.client_disconnected()
+            await poller.stop()
+            await poller.sim_client.close()
+
+        asyncio.run(lifespan())
+        asyncio.run(lifespan())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,230 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from cityflow_api.config import Settings
+from cityflow_api.models import LiveMetrics, SimStatePayload
+from cityflow_api.storage import RunStore
+
+
+def make_settings(data_dir, **overrides):
+    data_dir = Path(data_dir)
+    for dirname in ("replays", "metrics"):
+        (data_dir / dirname).mkdir(parents=True, exist_ok=True)
+    return Settings(data_dir=data_dir, **overrides)
+
+
+async def create_runs(store, count):
+    runs = []
+    for _ in range(count):
+        runs.append(
+            await store.create_run(
+                preset_id="demo",
+                steps=10,
+                speed_hz=10,
+                seed=0,
+                save_replay=True,
+                config_path="/tmp/config.json",
+            )
+        )
+    return runs
+
+
+class TestRunsIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.settings = make_settings(self._tmp.name, retention_limit=2)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def index_lines(self, store):
+        return store.index_path.read_bytes().splitlines()
+
+    def test_rebuild_after_delete(self):
+        """Last snapshot per run wins and retention tombstones drop runs on reload"""
+        store = RunStore(self.settings)
+
+        async def scenario():
+            runs = await create_runs(store, 3)
+            await store.add_tag(runs[1].run_id, "baseline")
+            await store.mark_status(runs[2].run_id, "completed")
+            return runs
+
+        runs = asyncio.run(scenario())
+        # Each mutation appended a line; the evicted run left a tombstone.
+        self.assertGreater(len(self.index_lines(store)), 2)
+
+        reloaded = RunStore(self.settings)
+        self.assertEqual([info.run_id for info in reloaded.list_runs()], [runs[2].run_id, runs[1].run_id])
+        self.assertIsNone(reloaded.get(runs[0].run_id))
+        self.assertEqual(reloaded.get(runs[1].run_id).tags, ["baseline"])
+        self.assertEqual(reloaded.get(runs[2].run_id).status, "completed")
+        self.assertEqual(len(self.index_lines(reloaded)), 2)
+        self.assertEqual(list(reloaded.index_path.parent.glob("*.tmp")), [])
+
+    def test_compact_index_not_rewritten(self):
+        """An index that is already one line per run is left untouched at startup"""
+        store = RunStore(self.settings)
+        asyncio.run(create_runs(store, 2))
+        RunStore(self.settings)
+        before = store.index_path.stat()
+        with mock.patch("cityflow_api.storage._atomic_write_bytes") as write:
+            reloaded = RunStore(self.settings)
+        write.assert_not_called()
+        self.assertEqual(len(reloaded.list_runs()), 2)
+        self.assertEqual(store.index_path.stat().st_mtime_ns, before.st_mtime_ns)
+
+    def test_failed_compaction_keeps_index(self):
+        """A compaction that fails before the swap leaves the previous index intact"""
+        store = RunStore(self.settings)
+        asyncio.run(create_runs(store, 3))
+        original = store.index_path.read_bytes()
+        with mock.patch("cityflow_api.storage.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                RunStore(self.settings)
+        self.assertEqual(store.index_path.read_bytes(), original)
+        self.assertEqual(list(store.index_path.parent.glob("*.tmp")), [])
+        self.assertEqual(len(RunStore(self.settings).list_runs()), 2)
+
+
+class TestRunWriters(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.settings = make_settings(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_reads_see_buffered_samples(self):
+        """Metrics and replay reads flush the run's buffered writes first"""
+        store = RunStore(self.settings)
+
+        async def scenario():
+            (run,) = await create_runs(store, 1)
+            for t in range(3):
+                state = SimStatePayload(
+                    t=t, run_id=run.run_id, status="running", metrics_live=LiveMetrics(avg_speed=1.5)
+                )
+                store.write_replay_sample(run.run_id, state)
+                store.write_metrics_sample(run.run_id, state)
+            records = await store.load_metrics(run.run_id)
+            frames = await store.get_replay(run.run_id)
+            return records, frames
+
+        records, frames = asyncio.run(scenario())
+        self.assertEqual([record.t for record in records], [0, 1, 2])
+        self.assertEqual([frame["t"] for frame in frames], [0, 1, 2])
+
+    def test_flush_after_writers_closed(self):
+        """Completing a run closes its writers; later flushes skip them instead of raising"""
+        store = RunStore(self.settings)
+
+        async def scenario():
+            await store.start()
+            (run,) = await create_runs(store, 1)
+            state = SimStatePayload(t=1, run_id=run.run_id, status="running")
+            store.write_metrics_sample(run.run_id, state)
+            writers = list(store._writers[run.run_id].values())
+            await store.mark_status(run.run_id, "completed")
+            self.assertTrue(all(writer.closed for writer in writers))
+            store.flush_run(run.run_id)
+            # A stray writer left registered after close must not break flushing either.
+            store._writers[run.run_id] = {store.metrics_path(run.run_id): writers[0]}
+            store.flush_run(run.run_id)
+            await asyncio.sleep(0.3)
+            self.assertFalse(store._flush_task.done())
+            await store.stop()
+            return await store.load_metrics(run.run_id)
+
+        self.assertEqual([record.t for record in asyncio.run(scenario())], [1])
+
+    def test_late_sample_after_completion_is_closed(self):
+        """A writer reopened for a finished run is closed by the next flush, not kept until stop()"""
+        store = RunStore(self.settings)
+
+        async def scenario():
+            await store.start()
+            (run,) = await create_runs(store, 1)
+            await store.mark_status(run.run_id, "completed")
+            late_state = SimStatePayload(t=5, run_id=run.run_id, status="completed")
+            store.write_metrics_sample(run.run_id, late_state)
+            late = store._writers[run.run_id][store.metrics_path(run.run_id)]
+            await asyncio.sleep(0.3)
+            self.assertTrue(late.closed)
+            self.assertNotIn(run.run_id, store._writers)
+            await store.stop()
+            return await store.load_metrics(run.run_id)
+
+        self.assertEqual([record.t for record in asyncio.run(scenario())], [5])
+
+
+class TestRunFiles(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.settings = make_settings(self._tmp.name)
+        self.store = RunStore(self.settings)
+        (self.run,) = asyncio.run(create_runs(self.store, 1))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, path, lines):
+        path.write_bytes(b"".join(line + b"\n" for line in lines))
+
+    def test_metrics_bulk_parse(self):
+        """A clean file is parsed in one pass and re-read when it grows"""
+        path = self.store.metrics_path(self.run.run_id)
+        self.write(path, [b'{"t":0,"vehicle_count":1}', b"", b'{"t":1,"vehicle_count":2,"avg_speed":3.5}'])
+        records = asyncio.run(self.store.load_metrics(self.run.run_id))
+        self.assertEqual([(r.t, r.vehicle_count, r.avg_speed) for r in records], [(0, 1, None), (1, 2, 3.5)])
+        with path.open("ab") as fh:
+            fh.write(b'{"t":2,"vehicle_count":4}\n')
+        self.assertEqual([r.t for r in asyncio.run(self.store.load_metrics(self.run.run_id))], [0, 1, 2])
+        csv_body = asyncio.run(self.store.load_metrics_csv(self.run.run_id))
+        self.assertEqual(csv_body.splitlines()[0], b"t,vehicle_count,avg_speed,avg_waiting,throughput")
+        self.assertEqual(csv_body.splitlines()[2], b"1,2,3.5,,")
+
+    def test_metrics_bad_lines_skipped(self):
+        """A corrupt or invalid line drops only that line, not the whole file"""
+        self.write(
+            self.store.metrics_path(self.run.run_id),
+            [
+                b'{"t":0,"vehicle_count":1}',
+                b'{"t":1,"vehic',
+                b'{"t":"x","vehicle_count":1}',
+                b'{"t":3,"vehicle_count":2}',
+            ],
+        )
+        records = asyncio.run(self.store.load_metrics(self.run.run_id))
+        self.assertEqual([r.t for r in records], [0, 3])
+
+    def test_completed_csv_written_atomically(self):
+        """A completed run's CSV is swapped in whole; a failed write leaves no partial file"""
+        self.write(self.store.metrics_path(self.run.run_id), [b'{"t":0,"vehicle_count":1}'])
+        asyncio.run(self.store.mark_status(self.run.run_id, "completed"))
+        csv_path = self.store.metrics_csv_path(self.run.run_id)
+        with mock.patch("cityflow_api.storage.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                asyncio.run(self.store.load_metrics_csv(self.run.run_id))
+        self.assertFalse(csv_path.exists())
+        self.assertEqual(list(csv_path.parent.glob("*.tmp")), [])
+        body = asyncio.run(self.store.load_metrics_csv(self.run.run_id))
+        self.assertEqual(csv_path.read_bytes(), body)
+
+    def test_replay_bad_lines_skipped(self):
+        """Replay readers yield each valid line once and skip corrupt ones"""
+        self.write(self.store.replay_path(self.run.run_id), [b'{"t":0}', b'{"t":', b'{"t":2}'])
+        frames = asyncio.run(self.store.get_replay(self.run.run_id))
+        self.assertEqual(frames, [{"t": 0}, {"t": 2}])
+        self.assertEqual(list(self.store.iter_replay_lines(self.run.run_id)), [b'{"t":0}', b'{"t":2}'])
+        self.assertEqual(asyncio.run(self.store.get_replay(self.run.run_id, limit=1)), [{"t": 0}])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
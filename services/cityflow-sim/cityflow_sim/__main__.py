@@ -11,6 +11,9 @@ def main() -> None:
         port=7001,
         log_level="info",
         access_log=False,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
     )
 
 
@@ -18,6 +18,19 @@ class Settings(BaseModel):
     idle_sleep: float = Field(
         default_factory=lambda: float(os.getenv("SIM_IDLE_SLEEP", "0.2"))
     )
+    # Ticks (one engine hop + one broadcast each) per second are capped here; above it,
+    # ceil(speed_hz / max_tick_hz) steps share a tick, e.g. 2 at 30 Hz, 3 at 60 Hz.
+    max_tick_hz: int = Field(
+        default_factory=lambda: int(os.getenv("SIM_MAX_TICK_HZ", "20"))
+    )
+    # Minimum steps per tick while nobody is subscribed to the state stream.
+    headless_batch: int = Field(
+        default_factory=lambda: int(os.getenv("SIM_HEADLESS_BATCH", "10"))
+    )
+    # Minimum gap between WS fan-outs; ticks in between coalesce into the newest state.
+    min_broadcast_interval_s: float = Field(
+        default_factory=lambda: float(os.getenv("SIM_MIN_BROADCAST_INTERVAL", "0"))
+    )
 
 
 @lru_cache(maxsize=None)
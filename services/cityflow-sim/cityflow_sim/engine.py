@@ -1,5 +1,7 @@
+import json
 from dataclasses import dataclass
-from typing import Dict, Optional
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional, Tuple
 
 try:
     import cityflow  # type: ignore
@@ -14,12 +16,22 @@ else:  # pragma: no cover - import success path
 class EngineSnapshot:
     current_time: int
     vehicle_count: int
-    lane_vehicle_count: Dict[str, int]
-    lane_waiting_vehicle_count: Dict[str, int]
+    # Lane data column-wise: lane_vehicles[i] / lane_waiting[i] belong to lane_ids[i].
+    lane_ids: Tuple[str, ...]
+    lane_vehicles: List[int]
+    lane_waiting: List[int]
     vehicle_speed: Dict[str, float]
     average_travel_time: Optional[float]
 
 
+def _lane_getter(lane_ids: Tuple[str, ...]) -> Callable[[Dict[str, int]], Tuple[int, ...]]:
+    # Specialised to the network's lane order: one C-level itemgetter call per column,
+    # no per-lane Python loop. itemgetter returns a bare value for a single key.
+    if len(lane_ids) > 1:
+        return itemgetter(*lane_ids)
+    return lambda counts: tuple(counts[lane_id] for lane_id in lane_ids)
+
+
 class EngineAdapter:
     """Thin wrapper around the native cityflow.Engine bindings."""
 
@@ -27,7 +39,19 @@ class EngineAdapter:
         self.config_path = config_path
         self.seed = seed
         self.thread_num = thread_num
+        # The road network is fixed per engine, so lane ids are captured once and reused.
+        self._lane_ids: Tuple[str, ...] = ()
+        self._lane_getter = _lane_getter(self._lane_ids)
         self._engine = self._build_engine()
+        self._replay_log_file = self._read_replay_log_file()
+
+    def _read_replay_log_file(self) -> Optional[str]:
+        # Relative to the config's "dir", which is how Engine.set_replay_file() resolves it.
+        with open(self.config_path, "rb") as fh:
+            config = json.load(fh)
+        if not config.get("saveReplay"):
+            return None
+        return config.get("replayLogFile")
 
     def _build_engine(self):
         if cityflow is None:
@@ -39,7 +63,19 @@ class EngineAdapter:
         )
 
     def reset(self) -> None:
+        # CityFlow's Engine.reset() rewinds in place without re-parsing the config and roadnet.
+        # Reseed too (seed=True), or vehicle priorities differ from a freshly built engine.
+        native_reset = getattr(self._engine, "reset", None)
+        if callable(native_reset):
+            native_reset(True)
+            # The native reset leaves the replay log open at its end; reopen it so the file
+            # starts over at t=0 like a freshly built engine's would.
+            if self._replay_log_file:
+                self._engine.set_replay_file(self._replay_log_file)
+            return
         self.close()
+        self._lane_ids = ()
+        self._lane_getter = _lane_getter(self._lane_ids)
         self._engine = self._build_engine()
 
     def close(self) -> None:
@@ -70,11 +106,24 @@ class EngineAdapter:
                 average_travel_time = float(getter_avg())
             except Exception:
                 average_travel_time = None
+        lane_vehicle_count = self._engine.get_lane_vehicle_count()
+        lane_waiting_vehicle_count = self._engine.get_lane_waiting_vehicle_count()
+        lane_ids = self._lane_ids
+        if len(lane_ids) != len(lane_vehicle_count):
+            lane_ids = self._lane_ids = tuple(lane_vehicle_count)
+            self._lane_getter = _lane_getter(lane_ids)
+        try:
+            lane_vehicles = list(self._lane_getter(lane_vehicle_count))
+            lane_waiting = list(self._lane_getter(lane_waiting_vehicle_count))
+        except KeyError:  # pragma: no cover - bindings omitted a lane this tick
+            lane_vehicles = [lane_vehicle_count.get(lane_id, 0) for lane_id in lane_ids]
+            lane_waiting = [lane_waiting_vehicle_count.get(lane_id, 0) for lane_id in lane_ids]
         return EngineSnapshot(
             current_time=int(self._engine.get_current_time()),
             vehicle_count=int(self._engine.get_vehicle_count()),
-            lane_vehicle_count=dict(self._engine.get_lane_vehicle_count()),
-            lane_waiting_vehicle_count=dict(self._engine.get_lane_waiting_vehicle_count()),
+            lane_ids=lane_ids,
+            lane_vehicles=lane_vehicles,
+            lane_waiting=lane_waiting,
             vehicle_speed=vehicle_speed,
             average_travel_time=average_travel_time,
         )
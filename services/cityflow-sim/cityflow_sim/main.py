@@ -1,7 +1,12 @@
 from datetime import datetime
 from typing import Dict
 from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - stdlib fallback for bare dev environments
+    orjson = None
 
 from .config import get_settings
 from .models import (
@@ -17,7 +22,11 @@ from .service import SimulationService
 def create_app() -> FastAPI:
     settings = get_settings()
     service = SimulationService()
-    app = FastAPI(title="CityFlow Simulation Service", version="0.1.0")
+    app = FastAPI(
+        title="CityFlow Simulation Service",
+        version="0.1.0",
+        default_response_class=ORJSONResponse if orjson is not None else JSONResponse,
+    )
 
     @app.on_event("startup")
     async def _startup() -> None:  # pragma: no cover - FastAPI hook
@@ -76,20 +85,19 @@ def create_app() -> FastAPI:
     @app.get("/state", response_model=StateResponse)
     async def state_endpoint() -> StateResponse:
         state = await service.get_state()
-        return StateResponse(state=state)
+        return StateResponse(state=state.materialized())
 
     @app.websocket("/ws/state")
     async def state_stream(socket: WebSocket) -> None:
         await socket.accept()
-        queue = await service.subscribe()
+        slot = await service.subscribe()
         try:
             while True:
-                state = await queue.get()
-                payload = jsonable_encoder({"state": state.dict()})
-                await socket.send_json(payload)
+                frame = await slot.get()
+                await socket.send_bytes(frame)
         except WebSocketDisconnect:
             pass
         finally:
-            await service.unsubscribe(queue)
+            await service.unsubscribe(slot)
 
     return app
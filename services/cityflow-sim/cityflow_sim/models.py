@@ -1,8 +1,11 @@
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from typing_extensions import Literal
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, PrivateAttr, validator
+
+# (lane_ids, vehicles, waiting) as handed over by the engine, index-aligned.
+LaneColumns = Tuple[Tuple[str, ...], List[int], List[int]]
 
 
 class RunRequest(BaseModel):
@@ -63,6 +66,41 @@ class SimulationState(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     message: Optional[str] = None
 
+    # Engine lane data kept column-wise; ``lanes`` is only materialised from it on demand.
+    _lane_columns: Optional[LaneColumns] = PrivateAttr(default=None)
+
+    class Config:
+        # Published states are shared with subscribers; derive a new one with copy(update=...).
+        allow_mutation = False
+
+    def with_lane_columns(self, columns: LaneColumns, **update: Any) -> "SimulationState":
+        state = self.copy(update=dict(update, lanes={}))
+        state._lane_columns = columns
+        return state
+
+    def lane_payload(self) -> Dict[str, Dict[str, int]]:
+        columns = self._lane_columns
+        if columns is None:
+            return {lane_id: lane.dict() for lane_id, lane in self.lanes.items()}
+        lane_ids, vehicles, waiting = columns
+        return {
+            lane_id: {"vehicles": count, "waiting": queued}
+            for lane_id, count, queued in zip(lane_ids, vehicles, waiting)
+        }
+
+    def materialized(self) -> "SimulationState":
+        columns = self._lane_columns
+        if columns is None:
+            return self
+        lane_ids, vehicles, waiting = columns
+        lanes = {
+            lane_id: LaneState.construct(vehicles=count, waiting=queued)
+            for lane_id, count, queued in zip(lane_ids, vehicles, waiting)
+        }
+        state = self.copy(update={"lanes": lanes})
+        state._lane_columns = None
+        return state
+
 
 class StateResponse(BaseModel):
     ok: bool = True
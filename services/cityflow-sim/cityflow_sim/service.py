@@ -1,18 +1,26 @@
 import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from functools import partial
 from pathlib import Path
-from typing import Any, Callable, Coroutine, Dict, Optional, Set, TYPE_CHECKING, TypeVar
+from typing import Any, Callable, Coroutine, Dict, Optional, Tuple, TypeVar
+
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - stdlib fallback for bare dev environments
+    orjson = None
 
 from .config import get_settings
 from .engine import EngineAdapter, EngineSnapshot
-from .models import LaneState, MetricsLive, RunRequest, SimulationState
-
-if TYPE_CHECKING:  # pragma: no cover
-    from asyncio import Queue
+from .models import MetricsLive, RunRequest, SimulationState
 
 T = TypeVar("T")
 
+# (engine generation, steps, future) for a batch queued on the engine thread.
+_PendingStep = Tuple[int, int, "asyncio.Future[EngineSnapshot]"]
+
 
 def _create_task(coro: Coroutine[Any, Any, T]) -> asyncio.Task:
     try:
@@ -22,10 +30,30 @@ def _create_task(coro: Coroutine[Any, Any, T]) -> asyncio.Task:
         return loop.create_task(coro)
 
 
-async def _to_thread(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
-    loop = asyncio.get_event_loop()
-    bound = partial(func, *args, **kwargs)
-    return await loop.run_in_executor(None, bound)
+def encode_state_frame(state: SimulationState) -> bytes:
+    # Lanes come straight from the column data, never through per-lane LaneState models.
+    payload = state.dict(exclude={"lanes"})
+    payload["lanes"] = state.lane_payload()
+    if orjson is not None:
+        return orjson.dumps({"state": payload})
+    return json.dumps(jsonable_encoder({"state": payload})).encode("utf-8")
+
+
+class LatestSlot:
+    """Single-frame mailbox for one subscriber; a newer frame overwrites an unread one."""
+
+    def __init__(self) -> None:
+        self._frame = b""
+        self._event = asyncio.Event()
+
+    def put(self, frame: bytes) -> None:
+        self._frame = frame
+        self._event.set()
+
+    async def get(self) -> bytes:
+        await self._event.wait()
+        self._event.clear()
+        return self._frame
 
 
 class SimulationService:
@@ -38,37 +66,52 @@ class SimulationService:
         self._state = SimulationState()
         self._lock = asyncio.Lock()
         self._loop_task: Optional[asyncio.Task] = None
-        self._subscribers: Set["Queue"] = set()
-        self._subs_lock = asyncio.Lock()
+        # Engine steps run on their own thread, never queued behind other blocking calls.
+        self._engine_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cityflow-engine")
+        # Bumped whenever the engine is replaced, rewound or stepped outside the tick loop, so
+        # the loop can drop a pipelined batch that no longer matches the current state.
+        self._engine_generation = 0
+        # Batch queued by the tick loop and not yet applied; pause() settles it before returning.
+        self._in_flight: Optional[_PendingStep] = None
+        # Rebound (never mutated) on (un)subscribe, so the broadcaster iterates it lock-free.
+        self._subscribers: Tuple[LatestSlot, ...] = ()
+        # Newest state awaiting fan-out; the event is created in start() on the serving loop.
+        self._latest: Optional[SimulationState] = None
+        self._broadcast_event: Optional[asyncio.Event] = None
+        self._broadcast_task: Optional[asyncio.Task] = None
+        # Last encoded frame and the state it encodes, shared by the fan-out and new subscribers.
+        self._frame: Tuple[Optional[SimulationState], bytes] = (None, b"")
 
     async def start(self) -> None:
+        if self._broadcast_task is None:
+            self._broadcast_event = asyncio.Event()
+            self._broadcast_task = _create_task(self._broadcaster())
         if self._loop_task is None:
             self._loop_task = _create_task(self._loop())
 
     async def shutdown(self) -> None:
-        if self._loop_task:
-            self._loop_task.cancel()
-            try:
-                await self._loop_task
-            except asyncio.CancelledError:
-                pass
-            self._loop_task = None
+        for task in (self._loop_task, self._broadcast_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._loop_task = None
+        self._broadcast_task = None
         engine = self._engine
         if engine:
             engine.close()
+        self._engine_executor.shutdown(wait=False)
 
-    async def subscribe(self) -> "Queue":
-        queue: "Queue" = asyncio.Queue(maxsize=1)
-        async with self._lock:
-            snapshot = self._state.copy(deep=True)
-        await queue.put(snapshot)
-        async with self._subs_lock:
-            self._subscribers.add(queue)
-        return queue
+    async def subscribe(self) -> LatestSlot:
+        slot = LatestSlot()
+        slot.put(self._encoded(self._state))
+        self._subscribers = self._subscribers + (slot,)
+        return slot
 
-    async def unsubscribe(self, queue: "Queue") -> None:
-        async with self._subs_lock:
-            self._subscribers.discard(queue)
+    async def unsubscribe(self, slot: LatestSlot) -> None:
+        self._subscribers = tuple(s for s in self._subscribers if s is not slot)
 
     async def start_run(self, payload: RunRequest) -> SimulationState:
         async with self._lock:
@@ -83,6 +126,7 @@ class SimulationService:
                 thread_num=payload.thread_num,
             )
             self._active_request = payload
+            self._engine_generation += 1
             self._state = SimulationState(
                 run_id=payload.run_id,
                 status="running",
@@ -94,38 +138,38 @@ class SimulationService:
                 signals={},
                 updated_at=datetime.utcnow(),
             )
-            snapshot = self._state.copy(deep=True)
-        await self._broadcast(snapshot)
+            snapshot = self._state
+        self._publish(snapshot)
         return snapshot
 
     async def pause(self) -> SimulationState:
         async with self._lock:
             if self._state.status == "running":
-                self._state.status = "paused"
-                self._state.updated_at = datetime.utcnow()
-            snapshot = self._state.copy(deep=True)
-        await self._broadcast(snapshot)
+                await self._settle_in_flight()
+            if self._state.status == "running":
+                self._state = self._state.copy(
+                    update={"status": "paused", "updated_at": datetime.utcnow()}
+                )
+            snapshot = self._state
+        self._publish(snapshot)
         return snapshot
 
     async def resume(self) -> SimulationState:
         async with self._lock:
             if self._state.run_id and self._state.status in {"paused", "completed"}:
-                self._state.status = "running"
-                self._state.updated_at = datetime.utcnow()
-            snapshot = self._state.copy(deep=True)
-        await self._broadcast(snapshot)
+                self._state = self._state.copy(
+                    update={"status": "running", "updated_at": datetime.utcnow()}
+                )
+            snapshot = self._state
+        self._publish(snapshot)
         return snapshot
 
     async def reset(self) -> SimulationState:
         async with self._lock:
             if not self._active_request:
-                snapshot = self._state.copy(deep=True)
-                return snapshot
-            self._engine = EngineAdapter(
-                config_path=self._active_request.config_path,
-                seed=self._active_request.seed,
-                thread_num=self._active_request.thread_num,
-            )
+                return self._state
+            self._engine_generation += 1
+            # Paused before the engine is touched, so the tick loop cannot queue another batch.
             self._state = SimulationState(
                 run_id=self._active_request.run_id,
                 status="paused",
@@ -135,111 +179,235 @@ class SimulationService:
                 vehicle_count=0,
                 updated_at=datetime.utcnow(),
             )
-            snapshot = self._state.copy(deep=True)
-        await self._broadcast(snapshot)
+            engine = self._engine
+            if engine and engine.config_path == self._active_request.config_path:
+                # Same network: rewind the loaded engine rather than building a new one.
+                await self._in_engine_thread(engine.reset)
+            else:
+                if engine:
+                    engine.close()
+                self._engine = EngineAdapter(
+                    config_path=self._active_request.config_path,
+                    seed=self._active_request.seed,
+                    thread_num=self._active_request.thread_num,
+                )
+            snapshot = self._state
+        self._publish(snapshot)
         return snapshot
 
     async def set_speed(self, hz: int) -> SimulationState:
         hz = max(1, min(self.settings.max_speed_hz, hz))
         async with self._lock:
-            self._state.speed_hz = hz
-            self._state.updated_at = datetime.utcnow()
-            snapshot = self._state.copy(deep=True)
-        await self._broadcast(snapshot)
+            if self._state.speed_hz != hz:
+                self._state = self._state.copy(
+                    update={"speed_hz": hz, "updated_at": datetime.utcnow()}
+                )
+            snapshot = self._state
+        self._publish(snapshot)
         return snapshot
 
     async def step(self, steps: int) -> SimulationState:
-        engine = await self._get_engine()
-        snapshot = await _to_thread(engine.step, steps)
         async with self._lock:
+            engine = self._get_engine()
+            # Held across the step so the tick loop cannot queue a batch alongside it.
+            self._engine_generation += 1
+            snapshot = await self._in_engine_thread(engine.step, steps)
             self._apply_snapshot(snapshot)
             if self._state.status == "running":
-                self._state.status = "paused"
-            state_view = self._state.copy(deep=True)
-        await self._broadcast(state_view)
+                self._state = self._state.copy(update={"status": "paused"})
+            state_view = self._state
+        self._publish(state_view)
         return state_view
 
     async def get_state(self) -> SimulationState:
-        async with self._lock:
-            return self._state.copy(deep=True)
-
-    async def _broadcast(self, state: SimulationState) -> None:
-        async with self._subs_lock:
-            subscribers = list(self._subscribers)
-        for queue in subscribers:
-            try:
-                queue.put_nowait(state)
-            except asyncio.QueueFull:
-                try:
-                    queue.get_nowait()
-                except asyncio.QueueEmpty:
-                    pass
-                try:
-                    queue.put_nowait(state)
-                except asyncio.QueueFull:
-                    continue
+        # _state is only ever rebound to a new immutable snapshot, so reading it needs no lock.
+        return self._state
 
-    async def _get_engine(self) -> EngineAdapter:
-        async with self._lock:
-            if not self._engine:
-                raise RuntimeError("Engine not initialised. Start a run first.")
-            return self._engine
+    def _publish(self, state: SimulationState) -> None:
+        # States are immutable, so the same object means nothing changed (e.g. a no-op pause).
+        if state is self._latest:
+            return
+        # Hand the state to the broadcaster task; if it is behind, only the newest is sent.
+        self._latest = state
+        # Headless runs never wake the broadcaster; a later subscriber reads _state directly.
+        if self._subscribers and self._broadcast_event is not None:
+            self._broadcast_event.set()
+
+    async def _broadcaster(self) -> None:
+        event = self._broadcast_event
+        if event is None:
+            return
+        interval = self.settings.min_broadcast_interval_s
+        try:
+            while True:
+                await event.wait()
+                event.clear()
+                state = self._latest
+                if state is not None:
+                    self._broadcast(state)
+                if interval > 0:
+                    await asyncio.sleep(interval)
+        except asyncio.CancelledError:  # pragma: no cover - shutdown path
+            return
+
+    def _broadcast(self, state: SimulationState) -> None:
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        # Encode once per update; every subscriber gets the same bytes.
+        frame = self._encoded(state)
+        for slot in subscribers:
+            slot.put(frame)
+
+    def _encoded(self, state: SimulationState) -> bytes:
+        cached_state, frame = self._frame
+        if cached_state is not state:
+            frame = encode_state_frame(state)
+            self._frame = (state, frame)
+        return frame
+
+    async def _settle_in_flight(self) -> None:
+        # Called with _lock held. A queued batch cannot be cancelled mid-step, so wait for it
+        # and apply it here; the paused state then matches the engine, and no later tick is
+        # published. The generation bump makes the tick loop drop its copy of the result.
+        pending = self._in_flight
+        self._in_flight = None
+        if pending is None or pending[0] != self._engine_generation:
+            return
+        self._engine_generation += 1
+        try:
+            snapshot = await pending[2]
+        except Exception as exc:  # pragma: no cover - defensive
+            self._state = self._state.copy(
+                update={"status": "error", "message": str(exc), "updated_at": datetime.utcnow()}
+            )
+            return
+        self._apply_snapshot(snapshot)
+
+    async def _in_engine_thread(self, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._engine_executor, func, *args)
+
+    def _get_engine(self) -> EngineAdapter:
+        engine = self._engine
+        if not engine:
+            raise RuntimeError("Engine not initialised. Start a run first.")
+        return engine
 
     async def _loop(self) -> None:
+        loop = asyncio.get_event_loop()
+        # Absolute time the next tick is due; the period is tracked so speed changes re-anchor it.
+        next_deadline: Optional[float] = None
+        period = 0.0
+        # Batch already running on the engine thread.
+        pending: Optional[_PendingStep] = None
         try:
             while True:
-                async with self._lock:
-                    engine = self._engine
-                    status = self._state.status
-                    speed_hz = self._state.speed_hz or self.settings.default_speed_hz
-                if engine and status == "running":
-                    try:
-                        snapshot = await _to_thread(engine.step, 1)
-                    except Exception as exc:  # pragma: no cover - defensive
-                        async with self._lock:
-                            self._state.status = "error"
-                            self._state.message = str(exc)
-                            self._state.updated_at = datetime.utcnow()
-                            state_view = self._state.copy(deep=True)
-                        await self._broadcast(state_view)
+                if pending is None:
+                    # Lock-free pre-check; the submit re-checks status under the lock.
+                    if not self._engine or self._state.status != "running":
+                        next_deadline = None
                         await asyncio.sleep(self.settings.idle_sleep)
                         continue
                     async with self._lock:
-                        self._apply_snapshot(snapshot)
-                        state_view = self._state.copy(deep=True)
-                    await self._broadcast(state_view)
-                    await asyncio.sleep(max(1.0 / max(1, speed_hz), 0.0))
-                else:
+                        pending = self._submit_step(self._state.t)
+                    if pending is None:
+                        continue
+                generation, steps, future = pending
+                pending = None
+                try:
+                    snapshot = await future
+                except Exception as exc:  # pragma: no cover - defensive
+                    async with self._lock:
+                        if generation != self._engine_generation:
+                            continue
+                        self._in_flight = None
+                        self._state = self._state.copy(
+                            update={
+                                "status": "error",
+                                "message": str(exc),
+                                "updated_at": datetime.utcnow(),
+                            }
+                        )
+                        state_view = self._state
+                    self._publish(state_view)
+                    next_deadline = None
                     await asyncio.sleep(self.settings.idle_sleep)
+                    continue
+                async with self._lock:
+                    if generation != self._engine_generation:
+                        # start_run/reset/step touched the engine meanwhile, or pause()
+                        # already applied this result.
+                        continue
+                    self._in_flight = None
+                    # Queue the next batch before applying and broadcasting this one, so the
+                    # engine steps while the event loop builds and fans out the state.
+                    step_limit = self._state.step_limit
+                    if not step_limit or snapshot.current_time < step_limit:
+                        pending = self._submit_step(snapshot.current_time)
+                    self._apply_snapshot(snapshot)
+                    state_view = self._state
+                self._publish(state_view)
+                # Sleep to the deadline, not a fixed period, so step/broadcast time is absorbed.
+                now = loop.time()
+                tick_period = steps / max(1, state_view.speed_hz or self.settings.default_speed_hz)
+                if next_deadline is None or tick_period != period:
+                    next_deadline = now
+                    period = tick_period
+                next_deadline = max(next_deadline + period, now)
+                await asyncio.sleep(next_deadline - now)
         except asyncio.CancelledError:  # pragma: no cover - shutdown path
             return
 
+    def _submit_step(self, t: int) -> Optional[_PendingStep]:
+        # Called with _lock held, so status and generation cannot change until the batch is queued.
+        engine = self._engine
+        state = self._state
+        if not engine or state.status != "running":
+            return None
+        steps = self._steps_per_tick(state.speed_hz or self.settings.default_speed_hz, t)
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(self._engine_executor, engine.step, steps)
+        self._in_flight = (self._engine_generation, steps, future)
+        return self._in_flight
+
+    def _steps_per_tick(self, speed_hz: int, t: int) -> int:
+        # One thread hop and one broadcast per batch; never step past the run's step_limit.
+        max_tick_hz = max(1, self.settings.max_tick_hz)
+        steps = max(1, -(-speed_hz // max_tick_hz))
+        if not self._subscribers:
+            steps = max(steps, self.settings.headless_batch)
+        step_limit = self._state.step_limit
+        if step_limit:
+            steps = min(steps, max(1, step_limit - t))
+        return steps
+
     def _apply_snapshot(self, snapshot: EngineSnapshot) -> None:
-        self._state.t = snapshot.current_time
-        self._state.vehicle_count = snapshot.vehicle_count
-        lane_states: Dict[str, LaneState] = {}
-        for lane_id, count in snapshot.lane_vehicle_count.items():
-            waiting = snapshot.lane_waiting_vehicle_count.get(lane_id, 0)
-            lane_states[lane_id] = LaneState(vehicles=count, waiting=waiting)
-        self._state.lanes = lane_states
         avg_speed = None
         if snapshot.vehicle_speed:
             avg_speed = sum(snapshot.vehicle_speed.values()) / len(
                 snapshot.vehicle_speed
             )
         avg_waiting = None
-        if snapshot.lane_waiting_vehicle_count:
-            avg_waiting = sum(snapshot.lane_waiting_vehicle_count.values()) / len(
-                snapshot.lane_waiting_vehicle_count
-            )
+        if snapshot.lane_waiting:
+            avg_waiting = sum(snapshot.lane_waiting) / len(snapshot.lane_waiting)
         throughput = None
         if snapshot.current_time:
             throughput = snapshot.vehicle_count / snapshot.current_time
-        self._state.metrics_live = MetricsLive(
-            avg_speed=avg_speed,
-            avg_waiting=avg_waiting,
-            throughput=throughput,
-        )
-        self._state.updated_at = datetime.utcnow()
+        update: Dict[str, Any] = {
+            "t": snapshot.current_time,
+            "vehicle_count": snapshot.vehicle_count,
+            "metrics_live": MetricsLive(
+                avg_speed=avg_speed,
+                avg_waiting=avg_waiting,
+                throughput=throughput,
+            ),
+            "updated_at": datetime.utcnow(),
+        }
         if self._state.step_limit and snapshot.current_time >= self._state.step_limit:
-            self._state.status = "completed"
+            update["status"] = "completed"
+        # Swap in a new state rather than mutating the one subscribers may still hold.
+        # Lanes stay column-wise; no per-lane objects are built on the tick path.
+        self._state = self._state.with_lane_columns(
+            (snapshot.lane_ids, snapshot.lane_vehicles, snapshot.lane_waiting), **update
+        )
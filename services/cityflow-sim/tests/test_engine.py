@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from cityflow_sim.engine import EngineAdapter, _lane_getter, cityflow
+
+from .test_service import keep_alive, write_config
+
+
+class TestLaneGetter(unittest.TestCase):
+
+    counts = {"b": 2, "a": 1, "c": 3}
+
+    def test_column_order(self):
+        """Columns follow the given lane order, not the dict order"""
+        self.assertEqual(tuple(_lane_getter(("a", "b", "c"))(self.counts)), (1, 2, 3))
+        self.assertEqual(tuple(_lane_getter(("c", "a"))(self.counts)), (3, 1))
+
+    def test_single_and_no_lanes(self):
+        """One lane still yields a sequence, and no lanes yields an empty one"""
+        self.assertEqual(tuple(_lane_getter(("b",))(self.counts)), (2,))
+        self.assertEqual(tuple(_lane_getter(())(self.counts)), ())
+
+    def test_missing_lane(self):
+        """A lane the bindings left out raises KeyError for the snapshot fallback"""
+        with self.assertRaises(KeyError):
+            _lane_getter(("a", "z"))(self.counts)
+        with self.assertRaises(KeyError):
+            _lane_getter(("z",))(self.counts)
+
+
+@unittest.skipIf(cityflow is None, "CityFlow bindings are not installed")
+class TestEngineAdapter(unittest.TestCase):
+
+    period = 300
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.config_path = write_config(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def run_and_record(self, adapter):
+        record = []
+        for _ in range(self.period // 10):
+            snapshot = adapter.step(10)
+            record.append((snapshot.vehicle_count, snapshot.lane_vehicles, snapshot.lane_waiting))
+        return record
+
+    def test_lane_columns_match_bindings(self):
+        """Lane columns line up with the per-lane dicts the bindings return"""
+        adapter = keep_alive(EngineAdapter(self.config_path))
+        for _ in range(5):
+            snapshot = adapter.step(20)
+            vehicles = adapter._engine.get_lane_vehicle_count()
+            waiting = adapter._engine.get_lane_waiting_vehicle_count()
+            self.assertEqual(set(snapshot.lane_ids), set(vehicles))
+            self.assertEqual(snapshot.lane_vehicles, [vehicles[lane_id] for lane_id in snapshot.lane_ids])
+            self.assertEqual(snapshot.lane_waiting, [waiting[lane_id] for lane_id in snapshot.lane_ids])
+        self.assertGreater(sum(snapshot.lane_vehicles), 0)
+
+    def test_reset_replays_fresh_engine(self):
+        """Runs after reset() match each other and the freshly built engine's first run"""
+        adapter = keep_alive(EngineAdapter(self.config_path))
+        fresh = self.run_and_record(adapter)
+        adapter.reset()
+        first = self.run_and_record(adapter)
+        adapter.reset()
+        second = self.run_and_record(adapter)
+        self.assertEqual(first, second)
+        self.assertEqual(first, fresh)
+
+
+    def test_reset_restarts_replay_log(self):
+        """After reset() the replay file holds only frames from the restarted run"""
+        config_path = write_config(self._tmp.name, save_replay=True)
+        replay_path = os.path.join(self._tmp.name, "replay.txt")
+        adapter = keep_alive(EngineAdapter(config_path))
+        fresh = adapter.step(5)
+        adapter.step(15)
+        adapter.reset()
+        restarted = adapter.step(5)
+        with open(replay_path) as fh:
+            frames = fh.read().splitlines()
+        self.assertEqual(restarted.current_time, fresh.current_time)
+        self.assertEqual(len(frames), 5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from cityflow_sim.engine import EngineAdapter, cityflow
+from cityflow_sim.models import RunRequest
+from cityflow_sim.service import SimulationService
+
+EXAMPLES_DIR = Path(__file__).resolve().parents[3] / "examples"
+
+# CityFlow's Engine destructor can deadlock on its worker barrier, so engines built by the
+# tests are kept alive until the process exits instead of being destroyed between tests.
+_KEEP_ALIVE = []
+
+
+def keep_alive(obj):
+    _KEEP_ALIVE.append(obj)
+    return obj
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def slow_engine(delay):
+    """Widen the windows in which a step or a reset is running on the engine thread."""
+    step = EngineAdapter.step
+    reset = EngineAdapter.reset
+
+    def slow_step(self, steps=1):
+        time.sleep(delay)
+        return step(self, steps)
+
+    def slow_reset(self):
+        time.sleep(delay)
+        reset(self)
+
+    return mock.patch.multiple(EngineAdapter, step=slow_step, reset=slow_reset)
+
+
+def write_config(directory, save_replay=False):
+    """Example network; replay logs, if enabled, go to a copy of it inside directory."""
+    with open(EXAMPLES_DIR / "config.json") as fh:
+        config = json.load(fh)
+    config["dir"] = str(EXAMPLES_DIR) + os.sep
+    config["saveReplay"] = save_replay
+    if save_replay:
+        for key in ("roadnetFile", "flowFile"):
+            shutil.copy(str(EXAMPLES_DIR / config[key]), directory)
+        config["dir"] = directory + os.sep
+    path = os.path.join(directory, "config.json")
+    with open(path, "w") as fh:
+        json.dump(config, fh)
+    return path
+
+
+class TestStepsPerTick(unittest.TestCase):
+
+    def steps(self, speed_hz, subscribed=True, t=0, step_limit=None):
+        async def scenario():
+            service = SimulationService()
+            service.settings = service.settings.copy(update={"max_tick_hz": 20, "headless_batch": 10})
+            if subscribed:
+                service._subscribers = (object(),)
+            service._state = service._state.copy(update={"step_limit": step_limit})
+            return service._steps_per_tick(speed_hz, t)
+
+        return run(scenario())
+
+    def test_batches_above_tick_cap(self):
+        """Up to max_tick_hz every tick is one step; above it steps share a tick"""
+        self.assertEqual([self.steps(hz) for hz in (1, 10, 20, 21, 30, 40, 60)], [1, 1, 1, 2, 2, 2, 3])
+
+    def test_headless_and_step_limit(self):
+        """Headless runs take at least headless_batch steps, but never pass step_limit"""
+        self.assertEqual(self.steps(10, subscribed=False), 10)
+        self.assertEqual(self.steps(60, subscribed=False, t=95, step_limit=100), 5)
+        self.assertEqual(self.steps(60, t=99, step_limit=100), 1)
+
+
+@unittest.skipIf(cityflow is None, "CityFlow bindings are not installed")
+class TestPipelinedLoop(unittest.TestCase):
+
+    trials = 8
+    engine_delay = 0.05
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.config_path = write_config(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def request(self):
+        return RunRequest(run_id="test", config_path=self.config_path, steps=100000, speed_hz=60)
+
+    def test_reset_while_running(self):
+        """reset() rewinds both the state and the engine even with a batch in flight"""
+        async def scenario():
+            service = keep_alive(SimulationService())
+            await service.start()
+            try:
+                await service.start_run(self.request())
+                for trial in range(self.trials):
+                    await service.resume()
+                    await asyncio.sleep(0.25 + 0.007 * trial)
+                    await service.reset()
+                    await asyncio.sleep(0.2)
+                    state = await service.get_state()
+                    self.assertEqual(state.status, "paused")
+                    self.assertEqual(state.t, 0)
+                    self.assertEqual(service._engine._engine.get_current_time(), 0)
+            finally:
+                await service.shutdown()
+
+        with slow_engine(self.engine_delay):
+            run(scenario())
+
+    def test_step_while_running(self):
+        """A manual step pauses the run and leaves state and engine on the same tick"""
+        async def scenario():
+            service = keep_alive(SimulationService())
+            await service.start()
+            try:
+                await service.start_run(self.request())
+                for trial in range(self.trials):
+                    await service.resume()
+                    await asyncio.sleep(0.25 + 0.007 * trial)
+                    await service.step(5)
+                    await asyncio.sleep(0.2)
+                    state = await service.get_state()
+                    self.assertEqual(state.status, "paused")
+                    self.assertEqual(state.t, int(service._engine._engine.get_current_time()))
+            finally:
+                await service.shutdown()
+
+        with slow_engine(self.engine_delay):
+            run(scenario())
+
+    def test_pause_applies_batch_in_flight(self):
+        """pause() returns a state that already includes the batch in flight, and t stays put"""
+        async def scenario():
+            service = keep_alive(SimulationService())
+            await service.start()
+            try:
+                await service.start_run(self.request())
+                for trial in range(self.trials):
+                    await service.resume()
+                    await asyncio.sleep(0.25 + 0.007 * trial)
+                    paused = await service.pause()
+                    self.assertEqual(paused.status, "paused")
+                    self.assertEqual(paused.t, int(service._engine._engine.get_current_time()))
+                    await asyncio.sleep(0.2)
+                    self.assertIs(await service.get_state(), paused)
+                    self.assertIs(service._latest, paused)
+            finally:
+                await service.shutdown()
+
+        with slow_engine(self.engine_delay):
+            run(scenario())
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)